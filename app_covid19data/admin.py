@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import DataCovid19Item
+from .models import DataCovid19Item, IngestLedger, Country
 
-admin.site.register(DataCovid19Item)
\ No newline at end of file
+admin.site.register(DataCovid19Item)
+admin.site.register(IngestLedger)
+admin.site.register(Country)
@@ -0,0 +1,115 @@
+# by Richi Rod AKA @richionline / falken20
+
+import logging
+import os
+from datetime import date
+
+import pandas as pd
+from django.conf import settings
+
+from .models import DataCovid19Item
+from .rollups import CASES_FIELDS
+
+# The archive is optional, without pyarrow the data is only in the DB
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Folder of the archive with the data of every date in an Arrow IPC file, in a folder for every month
+# (empty for no archive)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+# Columns of the archive, with the names of the country and the state and the coordinates in every row
+ARCHIVE_COLUMNS = ['country', 'state', 'latitude', 'longitude', 'date', *CASES_FIELDS, 'incidence_rate',
+                   'case_fatality_ratio']
+ARCHIVE_SCHEMA = pa.schema([('country', pa.string()), ('state', pa.string()), ('latitude', pa.float64()),
+                            ('longitude', pa.float64()), ('date', pa.date32()),
+                            *[(field, pa.int64()) for field in CASES_FIELDS],
+                            ('incidence_rate', pa.float64()), ('case_fatality_ratio', pa.float64())]) if pa else None
+
+
+def is_enabled():
+    """ Return True if the archive is configured and pyarrow is installed """
+    return pa is not None and bool(ARCHIVE_DIR)
+
+
+def get_archive_path(_date):
+    """ Return the path of the file of a date in the archive """
+    return os.path.join(ARCHIVE_DIR, f'month={_date:%Y-%m}', f'{_date:%Y-%m-%d}.arrow')
+
+
+def get_archive_dates(_date_from=None, _date_to=None):
+    """
+    Return the dates with a file in the archive, from the names of the files
+    :param _date_from: First date, all the dates if None
+    :param _date_to: Last date, all the dates if None
+    :return: Sorted list of dates
+    """
+    dates = []
+    if not os.path.isdir(ARCHIVE_DIR):
+        return dates
+    for month in os.scandir(ARCHIVE_DIR):
+        if month.is_dir() and month.name.startswith('month='):
+            dates.extend(date.fromisoformat(entry.name[:-len('.arrow')]) for entry in os.scandir(month.path)
+                         if entry.name.endswith('.arrow'))
+    return sorted(day for day in dates
+                  if (_date_from is None or day >= _date_from) and (_date_to is None or day <= _date_to))
+
+
+def write_dates(_dates):
+    """
+    Write in the archive the data in DB of some dates, replacing their files. The errors are logged, the data
+    is already saved in DB
+    :param _dates: List of dates
+    :return: List of the paths written
+    """
+    paths = []
+    try:
+        rows = DataCovid19Item.objects.filter(date__in=_dates).order_by('date').values_list(
+            'location__country__name', 'location__state', 'location__latitude', 'location__longitude', 'date',
+            *CASES_FIELDS, 'incidence_rate', 'case_fatality_ratio')
+        df_archive = pd.DataFrame.from_records(rows.iterator(), columns=ARCHIVE_COLUMNS)
+
+        for day, df_date in df_archive.groupby('date', sort=False):
+            path = get_archive_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table = pa.Table.from_pandas(df_date, schema=ARCHIVE_SCHEMA, preserve_index=False)
+            # Without compression the files can be memory-mapped and read without copies
+            with pa.OSFile(f'{path}.tmp', 'wb') as sink, pa.ipc.new_file(sink, ARCHIVE_SCHEMA) as writer:
+                writer.write_table(table)
+            os.replace(f'{path}.tmp', path)
+            paths.append(path)
+
+        logging.info(f'{os.getenv("ID_LOG", "")} Archived {len(df_archive)} rows of {len(paths)} dates')
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+    return paths
+
+
+def read_date(_date, _columns=None):
+    """
+    Read the file of a date of the archive memory-mapped, the data is not copied until it is used
+    :param _date: Date
+    :param _columns: Columns to read, all the columns if None
+    :return: Arrow table
+    """
+    table = pa.ipc.open_file(pa.memory_map(get_archive_path(_date))).read_all()
+    return table.select(_columns) if _columns else table
+
+
+def read_archive(_columns=None, _date_from=None, _date_to=None):
+    """
+    Read the data of the archive between two dates, for the analysis without reading the DB
+    :param _columns: Columns to read, all the columns if None
+    :param _date_from: First date, all the dates if None
+    :param _date_to: Last date, all the dates if None
+    :return: Dataframe with the data, empty if there is no data
+    """
+    tables = [read_date(day, _columns) for day in get_archive_dates(_date_from, _date_to)]
+    if not tables:
+        return pd.DataFrame(columns=_columns or ARCHIVE_COLUMNS)
+    return pa.concat_tables(tables).to_pandas()
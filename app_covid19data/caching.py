@@ -0,0 +1,82 @@
+# by Richi Rod AKA @richionline / falken20
+
+import functools
+import hashlib
+import logging
+import os
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.timezone import now
+from .models import DataGeneration
+
+# Seconds to keep the data generation in cache before reading it again from DB, the web and
+# the cron are different processes so the generation is always saved in DB
+DATA_GENERATION_TIMEOUT = int(os.getenv('DATA_GENERATION_TIMEOUT', 60))
+# Seconds to keep the data and responses of the views in cache
+VIEW_CACHE_TIMEOUT = int(os.getenv('VIEW_CACHE_TIMEOUT', 60 * 60 * 24))
+KEY_DATA_GENERATION = 'data_generation'
+
+
+def get_data_generation():
+    """ Return the current data generation """
+    generation = cache.get(KEY_DATA_GENERATION)
+    if generation is None:
+        generation = DataGeneration.objects.filter(id=1).values_list('generation', flat=True).first() or 0
+        cache.set(KEY_DATA_GENERATION, generation, DATA_GENERATION_TIMEOUT)
+    return generation
+
+
+def bump_data_generation():
+    """
+    Increase the data generation, so all the data and responses in cache are not used anymore
+    :return: The new data generation
+    """
+    with transaction.atomic():
+        data_generation, _ = DataGeneration.objects.select_for_update().get_or_create(id=1)
+        data_generation.generation += 1
+        data_generation.update_date = now()
+        data_generation.save()
+
+    cache.set(KEY_DATA_GENERATION, data_generation.generation, DATA_GENERATION_TIMEOUT)
+    logging.info(f'{os.getenv("ID_LOG", "")} New data generation: {data_generation.generation}')
+
+    return data_generation.generation
+
+
+def get_cache_key(*_parts):
+    """ Return a cache key for the parts in the current data generation """
+    key = ':'.join(str(part) for part in _parts)
+    return f'covid19:{get_data_generation()}:{hashlib.md5(key.encode()).hexdigest()}'
+
+
+def get_cached_data(_key, _function):
+    """
+    Return the data in cache for the key in the current data generation, or get it with the function
+    :param _key: Key of the data, for example the view name and its params
+    :param _function: Function without params which returns the data
+    :return: The data
+    """
+    key = get_cache_key(_key)
+    data = cache.get(key)
+    if data is None:
+        data = _function()
+        cache.set(key, data, VIEW_CACHE_TIMEOUT)
+    return data
+
+
+def cache_view(_view):
+    """ Decorator to cache the GET responses of a view in the current data generation """
+    @functools.wraps(_view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return _view(request, *args, **kwargs)
+
+        key = get_cache_key(_view.__name__, *args, *kwargs.values(), request.GET.urlencode())
+        response = cache.get(key)
+        if response is None:
+            response = _view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response, VIEW_CACHE_TIMEOUT)
+        return response
+
+    return wrapper
@@ -0,0 +1,97 @@
+# by Richi Rod AKA @richionline / falken20
+
+import functools
+import logging
+import os
+from django.conf import settings
+from django.utils.text import slugify
+from . import graphs
+from .models import GlobalDaily, CountryDaily
+from .rollups import GLOBAL, get_country_name
+
+# Images rendered on demand kept in the memory of every process
+GRAPH_CACHE_SIZE = int(os.getenv('GRAPH_CACHE_SIZE', 256))
+# Folder for the images rendered on demand shared by the processes (empty for no cache in disk) and
+# maximum number of images in it, the least recently used are deleted
+GRAPH_CACHE_DIR = os.getenv('GRAPH_CACHE_DIR', os.path.join(settings.BASE_DIR, 'graph_cache'))
+GRAPH_CACHE_FILES = int(os.getenv('GRAPH_CACHE_FILES', 2000))
+IMAGE_FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+def get_series(_country, _field):
+    """
+    Return the values per day of a field for a country, from the rollups
+    :param _country: Country name in any case or Global
+    :param _field: Cases field
+    :return: List of values, empty if the country has no data
+    """
+    country = get_country_name(_country)
+    if country is None:
+        return []
+    if country == GLOBAL:
+        queryset = GlobalDaily.objects.all()
+    else:
+        queryset = CountryDaily.objects.filter(country=country)
+    return list(queryset.order_by('date').values_list(_field, flat=True))
+
+
+def get_cache_path(_country, _graph_type, _generation, _format):
+    """ Return the path of an image in the cache in disk """
+    return os.path.join(GRAPH_CACHE_DIR, f'{_generation}_{_graph_type}_{slugify(_country)}.{_format}')
+
+
+def save_cache_file(_path, _image):
+    """ Save an image in the cache in disk, deleting the least recently used ones over the limit """
+    os.makedirs(GRAPH_CACHE_DIR, exist_ok=True)
+    with open(f'{_path}.tmp', 'wb') as file:
+        file.write(_image)
+    os.replace(f'{_path}.tmp', _path)
+
+    files = [entry for entry in os.scandir(GRAPH_CACHE_DIR) if entry.is_file()]
+    if len(files) > GRAPH_CACHE_FILES:
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - GRAPH_CACHE_FILES]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                # Deleted by another process
+                pass
+
+
+@functools.lru_cache(maxsize=GRAPH_CACHE_SIZE)
+def get_graph_image(_country, _graph_type, _generation, _format='png'):
+    """
+    Return the image of a graph of a country, from the cache in memory, from the cache in disk or rendered
+    from the rollups. The data generation is part of the key, so the images of old data are not used anymore.
+    :param _country: Country name or Global
+    :param _graph_type: Type of graph: confirmed, recovered or death
+    :param _generation: Current data generation
+    :param _format: Format of the image: png or svg
+    :return: Content of the image, None if the country has no data
+    """
+    try:
+        path = get_cache_path(_country, _graph_type, _generation, _format) if GRAPH_CACHE_DIR else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as file:
+                image = file.read()
+            # The modification date is the last use for deleting the least recently used
+            os.utime(path)
+            return image
+
+        field, label, color = graphs.GRAPH_TYPES[_graph_type]
+        values = get_series(_country, field)
+        if not values:
+            return None
+
+        logging.info(f'{os.getenv("ID_LOG", "")} Rendering graph {_graph_type} for {_country}')
+        image = graphs.render_graph(values, f'{label} in {_country}', color, _format)
+        if path:
+            save_cache_file(path, image)
+        return image
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
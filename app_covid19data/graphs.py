@@ -0,0 +1,111 @@
+# by Richi Rod AKA @richionline / falken20
+
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.style
+import numpy as np
+# Object-oriented API with the Agg canvas, without the global state of pyplot
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Type of graph (like in the URLs) with the cases field, the label and the color of the line
+GRAPH_TYPES = {
+    'confirmed': ('confirmed_cases', 'Confirmed cases', 'black'),
+    'death': ('dead_cases', 'Dead cases', 'red'),
+    'recovered': ('recovered_cases', 'Recovered cases', 'blue'),
+}
+# 'seaborn-talk' is called 'seaborn-v0_8-talk' since matplotlib 3.6
+GRAPH_STYLE = next((style for style in ['seaborn-v0_8-talk', 'seaborn-talk'] if style in matplotlib.style.available),
+                   'default')
+# Processes for rendering the graphs, with 1 the graphs are rendered in the current process
+GRAPH_WORKERS = int(os.getenv('GRAPH_WORKERS', os.cpu_count() or 1))
+
+
+def render_graph(_values, _label='Graph', _color='Pink', _format='png'):
+    """
+    Render the graph with the values
+    :param _values: List of values to show, one per day
+    :param _label: Label to show in the plot
+    :param _color: Color for the line in the graph
+    :param _format: Format of the image
+    :return: Content of the image
+    """
+    # The style only changes the params of this process while the figure is created and saved
+    with matplotlib.style.context(GRAPH_STYLE):
+        figure = Figure()
+        FigureCanvasAgg(figure)
+        axes = figure.subplots()
+        axes.plot(range(len(_values)), _values, color=_color, label=_label, linewidth=1.0)
+        axes.set_xlabel('Days')
+        axes.set_ylabel('People number')
+        axes.set_title('COVID-19 Evolution')
+        axes.grid(True)
+        axes.legend(loc='upper left')
+
+        image = io.BytesIO()
+        figure.savefig(image, format=_format)
+    return image.getvalue()
+
+
+def get_series_hash(_values, _label, _color):
+    """ Return the hash of the values and the look of a graph, to know if it has to be rendered again """
+    series_hash = hashlib.sha256(np.asarray(_values, dtype='float64').tobytes())
+    series_hash.update(f'{_label}:{_color}:{GRAPH_STYLE}'.encode())
+    return series_hash.hexdigest()
+
+
+def save_graph(_job):
+    """
+    Render the graph of a job and save it, with the hash of the series in a file next to the image
+    :param _job: Tuple with the path of the image, the values, the label, the color and the hash of the series
+    :return: Path of the image
+    """
+    path, values, label, color, series_hash = _job
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(f'{path}.tmp', 'wb') as file:
+        file.write(render_graph(values, label, color))
+    os.replace(f'{path}.tmp', path)
+
+    # The hash is saved after the image, so an image half rendered is always rendered again
+    with open(f'{path}.sha256', 'w') as file:
+        file.write(series_hash)
+    return path
+
+
+def is_graph_changed(_path, _series_hash):
+    """ Return True if the image does not exist or it was rendered with another series """
+    try:
+        with open(f'{_path}.sha256') as file:
+            return file.read() != _series_hash or not os.path.exists(_path)
+    except FileNotFoundError:
+        return True
+
+
+def render_graphs(_jobs, _workers=GRAPH_WORKERS):
+    """
+    Render and save the graphs in a pool of processes, skipping the graphs whose series has not changed
+    :param _jobs: List of tuples with the path of the image, the values, the label and the color
+    :param _workers: Number of processes
+    :return: List of paths of the rendered images
+    """
+    try:
+        jobs = [(path, values, label, color, get_series_hash(values, label, color))
+                for path, values, label, color in _jobs]
+        jobs = [job for job in jobs if is_graph_changed(job[0], job[4])]
+        logging.info(f'{os.getenv("ID_LOG", "")} Rendering {len(jobs)} of {len(_jobs)} graphs')
+
+        if _workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(_workers, len(jobs))) as executor:
+                return list(executor.map(save_graph, jobs))
+        return [save_graph(job) for job in jobs]
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
@@ -0,0 +1,37 @@
+# by Richi Rod AKA @richionline / falken20
+
+import json
+import os
+from django.conf import settings
+
+# Folder of the heat maps generated by the cron and served by the heat map view. It is not a static folder,
+# WhiteNoise only finds the static files when the server starts
+HEAT_MAP_DIR = os.getenv('HEAT_MAP_DIR', os.path.join(settings.BASE_DIR, 'heat_map'))
+# File with the name of the current heat map
+HEAT_MAP_POINTER = 'heat_map.json'
+# Encodings of the heat map saved by the cron with the extension of their file, in order of preference
+HEAT_MAP_ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def get_heat_map_name():
+    """ Return the name of the file of the current heat map, None if it is not generated yet """
+    try:
+        with open(os.path.join(HEAT_MAP_DIR, HEAT_MAP_POINTER)) as file:
+            return json.load(file)['file']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_heat_map_path(_name, _accept_encoding=''):
+    """
+    Return the path of the file of a heat map with the best encoding accepted by the client
+    :param _name: Name of the heat map
+    :param _accept_encoding: Header Accept-Encoding of the request
+    :return: Tuple with the path and the encoding, None for the file without compression
+    """
+    accepted = {encoding.split(';')[0].strip() for encoding in _accept_encoding.split(',')}
+    for encoding, extension in HEAT_MAP_ENCODINGS.items():
+        path = os.path.join(HEAT_MAP_DIR, f'{_name}{extension}')
+        if encoding in accepted and os.path.exists(path):
+            return path, encoding
+    return os.path.join(HEAT_MAP_DIR, _name), None
@@ -0,0 +1,125 @@
+# by Richi Rod AKA @richionline / falken20
+
+import contextlib
+import logging
+import os
+import time
+import zlib
+
+from django.conf import settings
+from django.db import connection
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# File of the lock of the jobs when the DB is not PostgreSQL
+JOBS_LOCK_FILE = os.getenv('JOBS_LOCK_FILE', os.path.join(settings.BASE_DIR, 'jobs.lock'))
+# Key of the PostgreSQL advisory lock of the jobs, the same in every process
+JOBS_LOCK_KEY = zlib.crc32(b'covid19web:jobs')
+
+
+@contextlib.contextmanager
+def jobs_lock():
+    """
+    Lock for running the jobs only in one process at the same time. In PostgreSQL it is an advisory lock,
+    shared by all the processes with the DB, in other DB a lock of a file in the machine.
+    :return: Context manager which returns True if the lock is acquired, False if other process has it
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [JOBS_LOCK_KEY])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [JOBS_LOCK_KEY])
+        return
+
+    # The lock of the file is released by the system if the process ends
+    with open(JOBS_LOCK_FILE, 'a') as file:
+        try:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired and fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def get_order(_jobs):
+    """
+    Return the names of the jobs in an order where every job is after its dependencies
+    :param _jobs: Dict with the name of every job and a tuple with its function and the names of its dependencies
+    :return: List of names, ValueError if a dependency does not exist or there is a cycle
+    """
+    order, visiting = [], set()
+
+    def visit(_name, _path):
+        if _name not in _jobs:
+            raise ValueError(f'Job {_name} of {_path[-1] if _path else "the run"} not found')
+        if _name in order:
+            return
+        if _name in visiting:
+            raise ValueError(f'Cycle in the jobs: {" -> ".join([*_path, _name])}')
+        visiting.add(_name)
+        for dependency in _jobs[_name][1]:
+            visit(dependency, [*_path, _name])
+        order.append(_name)
+
+    for name in _jobs:
+        visit(name, [])
+    return order
+
+
+def run_jobs(_jobs, _names=None):
+    """
+    Run the jobs in the order of their dependencies, every job as soon as its dependencies end. When a job
+    fails, the jobs which depend on it are skipped.
+    :param _jobs: Dict with the name of every job and a tuple with its function and the names of its dependencies
+    :param _names: Names of the jobs to run with their dependencies, all the jobs if None
+    :return: Dict with the name of every job run and a tuple with its status (ok, failed or skipped) and
+    its seconds
+    """
+    order = get_order(_jobs)
+    if _names is not None:
+        # The jobs indicated and all their dependencies
+        needed, pending = set(), list(_names)
+        while pending:
+            name = pending.pop()
+            if name not in _jobs:
+                raise ValueError(f'Job {name} not found')
+            if name not in needed:
+                needed.add(name)
+                pending.extend(_jobs[name][1])
+        order = [name for name in order if name in needed]
+
+    results = {}
+    for name in order:
+        function, dependencies = _jobs[name]
+        if any(results[dependency][0] != 'ok' for dependency in dependencies):
+            results[name] = ('skipped', 0)
+            logging.error(f'{os.getenv("ID_LOG", "")} Job {name} skipped, a dependency has not ended ok')
+            continue
+
+        start = time.perf_counter()
+        try:
+            function()
+            results[name] = ('ok', time.perf_counter() - start)
+        except Exception as err:
+            results[name] = ('failed', time.perf_counter() - start)
+            logging.error(f'\nJob: {name} \n'
+                          f'Line: {err.__traceback__.tb_lineno} \n'
+                          f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                          f'Type Error: {type(err).__name__} \n'
+                          f'Arguments:\n {err.args}')
+        logging.info(f'{os.getenv("ID_LOG", "")} Job {name} {results[name][0]} in {results[name][1]:.2f} s')
+
+    return results
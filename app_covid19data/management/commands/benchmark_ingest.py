@@ -0,0 +1,76 @@
+# by Richi Rod AKA @richionline / falken20
+
+import contextlib
+import io
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from cron import cron_covid19
+
+
+def create_synthetic_data(_days=300, _rows=1000, _seed=2020):
+    """
+    Create a list of dataframes like the daily report files, one per day
+    :param _days: Number of days (files)
+    :param _rows: Number of rows in every file
+    :param _seed: Seed for the random values
+    :return: List of dataframes
+    """
+    random = np.random.default_rng(_seed)
+    first_day = date(2020, 3, 1)
+    list_data = []
+    for day in range(_days):
+        confirmed = random.integers(0, 100000, _rows).astype(float)
+        # Like in the real files, some values are empty
+        confirmed[random.random(_rows) < 0.05] = np.nan
+        list_data.append(pd.DataFrame({
+            'Province_State': [f'State {row}' for row in range(_rows)],
+            'Country_Region': [f'Country {row % 200}' for row in range(_rows)],
+            'Last_Update': str(first_day + timedelta(days=day)),
+            'Latitude': random.uniform(-90, 90, _rows),
+            'Longitude': random.uniform(-180, 180, _rows),
+            'Confirmed': confirmed,
+            'Deaths': random.integers(0, 1000, _rows),
+            'Recovered': random.integers(0, 50000, _rows),
+            'Active': random.integers(0, 50000, _rows),
+        }))
+    return list_data
+
+
+class Command(BaseCommand):
+    help = 'Compare the ingest strategies (ROW, BULK, COPY, UPSERT) saving a synthetic dataset. ' \
+           'Every strategy runs in a transaction which is rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=300, help='Number of daily files')
+        parser.add_argument('--rows', type=int, default=1000, help='Number of rows in every daily file')
+        parser.add_argument('--strategies', default='ROW,BULK,COPY,UPSERT',
+                            help='Strategies to compare, comma separated')
+
+    def handle(self, *args, **options):
+        list_data = create_synthetic_data(options['days'], options['rows'])
+        total_rows = sum(len(df) for df in list_data)
+        self.stdout.write(f'Synthetic dataset: {len(list_data)} days, {total_rows} rows, DB {connection.vendor}')
+        if connection.vendor != 'postgresql':
+            self.stdout.write('COPY is only available in PostgreSQL, in this DB it is measured as BULK')
+
+        for strategy in options['strategies'].upper().split(','):
+            save_method = cron_covid19.SAVE_METHODS[strategy]
+            # The locations created by the previous strategy were rolled back
+            cron_covid19.reset_locations()
+            with transaction.atomic():
+                start = time.perf_counter()
+                # The save methods print a line per file
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for df in list_data:
+                        save_method(df.copy())
+                elapsed = time.perf_counter() - start
+                transaction.set_rollback(True)
+
+            self.stdout.write(f'{strategy:<5} {total_rows} rows in {elapsed:.2f} s '
+                              f'({total_rows / elapsed if elapsed else 0:,.0f} rows/sec)')
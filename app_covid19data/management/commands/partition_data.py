@@ -0,0 +1,57 @@
+# by Richi Rod AKA @richionline / falken20
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from app_covid19data import partitions
+from cron import cron_covid19
+
+
+class Command(BaseCommand):
+    help = 'Manage the monthly partitions of the data by date (PostgreSQL only): change the table to a ' \
+           'partitioned table, create the partitions of the next months, drop the old months or empty a month ' \
+           'before reloading it, with their rollups and files in the ingest ledger. In other DB it does nothing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Change the table of the data to a partitioned table, copying its rows')
+        parser.add_argument('--months-ahead', type=int, default=partitions.PARTITION_MONTHS_AHEAD,
+                            help='Months after the current one with their partition created in advance')
+        parser.add_argument('--drop-before', type=date.fromisoformat,
+                            help='Drop the partitions whose whole month is before this date (YYYY-MM-DD)')
+        parser.add_argument('--truncate', type=date.fromisoformat,
+                            help='Empty the partition of the month of this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(f'The partitions are only available in PostgreSQL, nothing to do in {connection.vendor}')
+            return
+
+        if options['convert']:
+            if partitions.is_partitioned():
+                self.stdout.write('The table is already partitioned')
+            else:
+                created = partitions.partition_table(options['months_ahead'])
+                self.stdout.write(f'Table partitioned in {len(created)} partitions')
+
+        if not partitions.is_partitioned():
+            raise CommandError('The table is not partitioned, run the command with --convert first')
+
+        today = date.today()
+        created = partitions.create_partitions(today, partitions.add_months(today, options['months_ahead']))
+        self.stdout.write(f'Partitions created: {", ".join(created) or "none"}')
+
+        # The data is removed with the rollups and the files in the ingest ledger of its dates, like in the ingest
+        if options['drop_before']:
+            before = set(partitions.get_partitions().values())
+            cron_covid19.delete_data(partitions.get_month(options['drop_before']))
+            dropped = sorted(before - set(partitions.get_partitions().values()))
+            self.stdout.write(f'Partitions dropped: {", ".join(dropped) or "none"}')
+
+        if options['truncate']:
+            name = cron_covid19.truncate_month(options['truncate'])
+            self.stdout.write(f'Partition emptied: {name}' if name else 'There is no partition for that month')
+
+        self.stdout.write(f'Partitions: {", ".join(partitions.get_partitions().values())}')
@@ -0,0 +1,62 @@
+# by Richi Rod AKA @richionline / falken20
+
+import time
+from datetime import date
+from itertools import groupby
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app_covid19data import archive, caching, partitions, rollups
+from app_covid19data.models import DataCovid19Item
+from cron import cron_covid19
+
+# Columns of the archive with the columns of the daily report files read by the ingest
+FILE_COLUMNS = {'country': cron_covid19.COL_COUNTRY,
+                'state': cron_covid19.COL_STATE,
+                'date': cron_covid19.COL_LAST_UPDATE,
+                **{field: col for col, field in {**cron_covid19.INTEGER_COLS, **cron_covid19.FLOAT_COLS,
+                                                 **cron_covid19.LOCATION_COLS}.items()}}
+
+
+class Command(BaseCommand):
+    help = 'Load the data in DB from the archive, without downloading the files, replacing the data of the ' \
+           'dates in the archive, and rebuild all the rollups. Every month is saved in one transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First date to load (YYYY-MM-DD), all the dates if not indicated')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last date to load (YYYY-MM-DD), all the dates if not indicated')
+
+    def handle(self, *args, **options):
+        if not archive.is_enabled():
+            raise CommandError('The archive needs pyarrow installed and ARCHIVE_DIR')
+        dates = archive.get_archive_dates(options['date_from'], options['date_to'])
+        if not dates:
+            raise CommandError(f'There is no data in the archive {archive.ARCHIVE_DIR}')
+
+        start = time.perf_counter()
+        cron_covid19.reset_locations()
+        rows = 0
+        try:
+            for month, month_dates in groupby(dates, key=lambda day: day.replace(day=1)):
+                month_dates = list(month_dates)
+                with transaction.atomic():
+                    partitions.ensure_partitions(month_dates)
+                    DataCovid19Item.objects.filter(date__in=month_dates).delete()
+                    # Only the data of a date is in memory at the same time
+                    for day in month_dates:
+                        df_data = archive.read_date(day).to_pandas().rename(columns=FILE_COLUMNS)
+                        cron_covid19.save_data_copy(df_data)
+                        rows += len(df_data)
+                self.stdout.write(f'{month:%Y-%m}: {len(month_dates)} dates loaded')
+        except Exception:
+            # The locations created in the transaction are not in DB anymore
+            cron_covid19.reset_locations()
+            raise
+
+        rollups.refresh_rollups()
+        caching.bump_data_generation()
+        self.stdout.write(f'{rows} rows of {len(dates)} dates loaded from the archive and rollups rebuilt in '
+                          f'{time.perf_counter() - start:.2f} s')
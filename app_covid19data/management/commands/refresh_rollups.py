@@ -0,0 +1,15 @@
+# by Richi Rod AKA @richionline / falken20
+
+from django.core.management.base import BaseCommand
+
+from app_covid19data import caching, rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild all the rollups (global by date, country by date, latest snapshot and trends) from the data'
+
+    def handle(self, *args, **options):
+        rollups.refresh_rollups()
+        # The views can not use their data in cache anymore
+        caching.bump_data_generation()
+        self.stdout.write('Rollups refreshed successfully')
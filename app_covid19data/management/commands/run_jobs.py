@@ -0,0 +1,67 @@
+# by Richi Rod AKA @richionline / falken20
+
+import os
+import time
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from django.core.management.base import BaseCommand, CommandError
+
+from app_covid19data import jobs
+from cron import cron_covid19, cron_graphs
+
+# Jobs with their function and the jobs they depend on. The rollups are refreshed by the ingest in the
+# transaction of every file, so the graphs and the heat map start when the last file is saved. The retention
+# deletes the old months after the ingest, before the graphs are generated
+JOBS = {
+    'ingest': (cron_covid19.covid19, []),
+    'retention': (cron_covid19.retention_job, ['ingest']),
+    'graphs': (cron_graphs.graphs_job, ['ingest']),
+    'heat_map': (cron_graphs.heat_map_job, ['ingest']),
+}
+# Hour of the daily run in production
+JOBS_HOUR = os.getenv('JOBS_HOUR', '12')
+
+
+class Command(BaseCommand):
+    help = 'Run the jobs (ingest of the data, retention, graphs and heat map) in the order of their dependencies, ' \
+           'only one run at the same time. With --schedule they run every day in this process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', help=f'Jobs to run with their dependencies, comma separated '
+                                           f'({",".join(JOBS)}), all the jobs if not indicated')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Run the jobs every day at JOBS_HOUR (every minute if ENV_PRO is not Y)')
+
+    def run(self, _names=None):
+        """ Run the jobs with the lock and show the time of every job """
+        with jobs.jobs_lock() as acquired:
+            if not acquired:
+                self.stdout.write('The jobs are running in other process, this run is skipped')
+                return None
+
+            start = time.perf_counter()
+            results = jobs.run_jobs(JOBS, _names)
+            for name, (status, seconds) in results.items():
+                self.stdout.write(f'{name:<10} {status:<8} {seconds:8.2f} s')
+            self.stdout.write(f'{"total":<10} {"":<8} {time.perf_counter() - start:8.2f} s')
+            return results
+
+    def handle(self, *args, **options):
+        names = options['jobs'].split(',') if options['jobs'] else None
+        if names and not set(names) <= set(JOBS):
+            raise CommandError(f'The jobs must be in {",".join(JOBS)}')
+
+        if not options['schedule']:
+            results = self.run(names)
+            if results and any(status != 'ok' for status, _ in results.values()):
+                raise CommandError('Some jobs have not ended ok')
+            return
+
+        scheduler = BlockingScheduler()
+        if os.getenv('ENV_PRO', 'Y') == 'Y':
+            self.stdout.write(f'Running in PRODUCTION environment, every day at {JOBS_HOUR}h')
+            scheduler.add_job(self.run, 'cron', hour=JOBS_HOUR, args=[names], max_instances=1, coalesce=True)
+        else:
+            self.stdout.write('Running in LOCAL environment, every minute')
+            scheduler.add_job(self.run, 'cron', minute='*', args=[names], max_instances=1, coalesce=True)
+        scheduler.start()
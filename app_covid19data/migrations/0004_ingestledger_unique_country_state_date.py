@@ -0,0 +1,104 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:14
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import DateTimeField, Exists, ExpressionWrapper, OuterRef
+import django.utils.timezone
+
+# The rows of a key saved more than this time before its last row are of a previous load of the same file,
+# the rows of one load (for example the counties of a state) are saved one after the other
+LOAD_WINDOW = timedelta(minutes=10)
+SUM_FIELDS = ['confirmed_cases', 'dead_cases', 'recovered_cases', 'active_cases']
+AVG_FIELDS = ['latitude', 'longitude', 'incidence_rate', 'case_fatality_ratio']
+
+
+def merge_duplicated_rows(apps, schema_editor):
+    """
+    Leave only one row for every country, state and date before creating the unique constraint. The rows of
+    the previous loads of the same file are deleted and the rest, like the counties of a state, are added in
+    one row. Every step is one query for all the keys.
+    """
+    DataCovid19Item = apps.get_model('app_covid19data', 'DataCovid19Item')
+
+    # NULL values are always different in a unique constraint
+    DataCovid19Item.objects.filter(state__isnull=True).update(state='')
+
+    newer = DataCovid19Item.objects.filter(
+        country=OuterRef('country'), state=OuterRef('state'), date=OuterRef('date'),
+        update_date__gt=ExpressionWrapper(OuterRef('update_date') + LOAD_WINDOW, output_field=DateTimeField()))
+    DataCovid19Item.objects.filter(Exists(newer)).delete()
+
+    quote = schema_editor.quote_name
+    table = quote(DataCovid19Item._meta.db_table)
+    key = 'country, state, date'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'SELECT MAX(id) FROM {table}')
+        max_id = cursor.fetchone()[0]
+        if max_id is None:
+            return
+
+        # A new row for every duplicated key and after that the rows added are deleted
+        cursor.execute(f'INSERT INTO {table} ({key}, {", ".join(SUM_FIELDS + AVG_FIELDS)}, update_date) '
+                       f'SELECT {key}, {", ".join(f"SUM({field})" for field in SUM_FIELDS)}, '
+                       f'{", ".join(f"AVG({field})" for field in AVG_FIELDS)}, MAX(update_date) '
+                       f'FROM {table} WHERE date IS NOT NULL GROUP BY {key} HAVING COUNT(*) > 1')
+        cursor.execute(f'DELETE FROM {table} WHERE id <= %s AND EXISTS ('
+                       f'SELECT 1 FROM {table} merged WHERE merged.id > %s AND merged.country = {table}.country '
+                       f'AND merged.state = {table}.state AND merged.date = {table}.date)', [max_id, max_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0003_auto_20201119_1232'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestLedger',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=255, unique=True)),
+                ('source_date', models.DateField(blank=True, null=True)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('row_count', models.IntegerField(default=0)),
+                ('update_date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='active_cases',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='case_fatality_ratio',
+            field=models.FloatField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='confirmed_cases',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='dead_cases',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='incidence_rate',
+            field=models.FloatField(blank=True, default=0, null=True),
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='recovered_cases',
+            field=models.IntegerField(blank=True, default=0, null=True),
+        ),
+        migrations.RunPython(merge_duplicated_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='datacovid19item',
+            constraint=models.UniqueConstraint(fields=('country', 'state', 'date'), name='unique_country_state_date'),
+        ),
+    ]
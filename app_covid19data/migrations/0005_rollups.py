@@ -0,0 +1,53 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0004_ingestledger_unique_country_state_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.TextField(max_length=100)),
+                ('date', models.DateField()),
+                ('confirmed_cases', models.IntegerField(blank=True, null=True)),
+                ('dead_cases', models.IntegerField(blank=True, null=True)),
+                ('recovered_cases', models.IntegerField(blank=True, null=True)),
+                ('active_cases', models.IntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GlobalDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('confirmed_cases', models.IntegerField(blank=True, null=True)),
+                ('dead_cases', models.IntegerField(blank=True, null=True)),
+                ('recovered_cases', models.IntegerField(blank=True, null=True)),
+                ('active_cases', models.IntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StateLatest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.TextField(db_index=True, max_length=100)),
+                ('state', models.TextField(blank=True, max_length=100, null=True)),
+                ('date', models.DateField()),
+                ('confirmed_cases', models.IntegerField(blank=True, null=True)),
+                ('dead_cases', models.IntegerField(blank=True, null=True)),
+                ('recovered_cases', models.IntegerField(blank=True, null=True)),
+                ('active_cases', models.IntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='countrydaily',
+            constraint=models.UniqueConstraint(fields=('country', 'date'), name='unique_countrydaily_country_date'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0005_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='countrydaily',
+            index=models.Index(fields=['date', '-dead_cases'], name='countrydaily_date_dead_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datacovid19item',
+            index=models.Index(fields=['country', 'date'], name='item_country_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datacovid19item',
+            index=models.Index(fields=['date', 'country', 'confirmed_cases', 'dead_cases', 'recovered_cases', 'active_cases'], name='item_date_country_cases_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datacovid19item',
+            index=models.Index(fields=['update_date'], name='item_update_date_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0007_datageneration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTrend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.TextField(max_length=100)),
+                ('date', models.DateField()),
+                ('new_confirmed_cases', models.IntegerField(blank=True, null=True)),
+                ('new_dead_cases', models.IntegerField(blank=True, null=True)),
+                ('new_recovered_cases', models.IntegerField(blank=True, null=True)),
+                ('new_active_cases', models.IntegerField(blank=True, null=True)),
+                ('avg7_confirmed_cases', models.FloatField(blank=True, null=True)),
+                ('avg7_dead_cases', models.FloatField(blank=True, null=True)),
+                ('avg7_recovered_cases', models.FloatField(blank=True, null=True)),
+                ('avg7_active_cases', models.FloatField(blank=True, null=True)),
+                ('avg14_confirmed_cases', models.FloatField(blank=True, null=True)),
+                ('avg14_dead_cases', models.FloatField(blank=True, null=True)),
+                ('avg14_recovered_cases', models.FloatField(blank=True, null=True)),
+                ('avg14_active_cases', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailytrend',
+            constraint=models.UniqueConstraint(fields=('country', 'date'), name='unique_dailytrend_country_date'),
+        ),
+    ]
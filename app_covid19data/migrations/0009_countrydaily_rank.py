@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:30
+
+from django.db import migrations, models
+from django.db.models import Case, When, F, FloatField, ExpressionWrapper
+from django.db.models.functions import Cast
+
+
+def calculate_taxes(apps, schema_editor):
+    """ Calculate the taxes of the rows already in the country rollup """
+    CountryDaily = apps.get_model('app_covid19data', 'CountryDaily')
+    CountryDaily.objects.update(**{
+        f'{tax}_tax': Case(When(confirmed_cases__gt=0,
+                                then=ExpressionWrapper(Cast(field, FloatField()) * 100 / F('confirmed_cases'),
+                                                       output_field=FloatField())),
+                           default=None, output_field=FloatField())
+        for tax, field in [('mortality', 'dead_cases'), ('recovered', 'recovered_cases')]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0008_dailytrend'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='countrydaily',
+            name='countrydaily_date_dead_idx',
+        ),
+        migrations.AddField(
+            model_name='countrydaily',
+            name='mortality_tax',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='countrydaily',
+            name='recovered_tax',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='countrydaily',
+            index=models.Index(fields=['date', '-dead_cases', 'country'], name='countrydaily_dead_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countrydaily',
+            index=models.Index(fields=['date', '-confirmed_cases', 'country'], name='countrydaily_conf_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countrydaily',
+            index=models.Index(fields=['date', '-mortality_tax', 'country'], name='countrydaily_mort_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='countrydaily',
+            index=models.Index(fields=['date', '-recovered_tax', 'country'], name='countrydaily_reco_rank_idx'),
+        ),
+        migrations.RunPython(calculate_taxes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+def create_countries(apps, schema_editor):
+    """ Create the countries with data in the country rollup """
+    Country = apps.get_model('app_covid19data', 'Country')
+    CountryDaily = apps.get_model('app_covid19data', 'CountryDaily')
+    countries = CountryDaily.objects.values_list('country', flat=True).distinct().order_by('country')
+    Country.objects.bulk_create([Country(name=country, key=country.lower()) for country in countries],
+                                batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0009_countrydaily_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Country',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(max_length=100, unique=True)),
+                ('key', models.TextField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.RunPython(create_countries, migrations.RunPython.noop),
+    ]
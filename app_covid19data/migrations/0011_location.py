@@ -0,0 +1,116 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:40
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, Sum
+import django.db.models.deletion
+
+
+def create_locations(apps, schema_editor):
+    """
+    Create the countries and locations of the data and link every row with its location. The names of a country
+    with other case are the same country, so the rows of a location and date are merged like in 0004.
+    """
+    Country = apps.get_model('app_covid19data', 'Country')
+    Location = apps.get_model('app_covid19data', 'Location')
+    DataCovid19Item = apps.get_model('app_covid19data', 'DataCovid19Item')
+
+    countries = DataCovid19Item.objects.values_list('country', flat=True).distinct().order_by('country')
+    Country.objects.bulk_create([Country(name=country, key=country.lower()) for country in countries],
+                                batch_size=1000, ignore_conflicts=True)
+    country_ids = dict(Country.objects.values_list('key', 'id'))
+
+    # The coordinates of the location are the average of all its rows
+    locations = DataCovid19Item.objects.values('country', 'state').annotate(latitude=Avg('latitude'),
+                                                                            longitude=Avg('longitude')).order_by()
+    for location in locations.iterator():
+        location_id = Location.objects.get_or_create(country_id=country_ids[location['country'].lower()],
+                                                     state=location['state'] or '',
+                                                     defaults={'latitude': location['latitude'],
+                                                               'longitude': location['longitude']})[0].id
+        DataCovid19Item.objects.filter(country=location['country'], state=location['state']) \
+            .update(location_id=location_id)
+
+    keys = DataCovid19Item.objects.values('location', 'date').annotate(rows=Count('id')).filter(rows__gt=1)
+    for key in keys.order_by().iterator():
+        rows = DataCovid19Item.objects.filter(location=key['location'], date=key['date'])
+        values = rows.aggregate(confirmed_cases=Sum('confirmed_cases'), dead_cases=Sum('dead_cases'),
+                                recovered_cases=Sum('recovered_cases'), active_cases=Sum('active_cases'),
+                                incidence_rate=Avg('incidence_rate'), case_fatality_ratio=Avg('case_fatality_ratio'))
+        first_id = rows.order_by('id').values_list('id', flat=True)[0]
+        rows.exclude(id=first_id).delete()
+        DataCovid19Item.objects.filter(id=first_id).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0010_country'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('state', models.TextField(blank=True, default='', max_length=100)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='locations',
+                                              to='app_covid19data.country')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(fields=('country', 'state'), name='unique_location_country_state'),
+        ),
+        migrations.AddField(
+            model_name='datacovid19item',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items',
+                                    to='app_covid19data.location'),
+        ),
+        migrations.RemoveConstraint(
+            model_name='datacovid19item',
+            name='unique_country_state_date',
+        ),
+        migrations.RunPython(create_locations, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='datacovid19item',
+            name='item_country_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='datacovid19item',
+            name='item_date_country_cases_idx',
+        ),
+        migrations.RemoveField(
+            model_name='datacovid19item',
+            name='country',
+        ),
+        migrations.RemoveField(
+            model_name='datacovid19item',
+            name='state',
+        ),
+        migrations.RemoveField(
+            model_name='datacovid19item',
+            name='latitude',
+        ),
+        migrations.RemoveField(
+            model_name='datacovid19item',
+            name='longitude',
+        ),
+        migrations.AlterField(
+            model_name='datacovid19item',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='items',
+                                    to='app_covid19data.location'),
+        ),
+        migrations.AddConstraint(
+            model_name='datacovid19item',
+            constraint=models.UniqueConstraint(fields=('location', 'date'), name='unique_location_date'),
+        ),
+        migrations.AddIndex(
+            model_name='datacovid19item',
+            index=models.Index(fields=['date', 'location', 'confirmed_cases', 'dead_cases', 'recovered_cases',
+                                       'active_cases'], name='item_date_location_cases_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:44
+
+from django.db import migrations, models
+from django.db.models import Case, When, F, FloatField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Cast
+
+CASES_FIELDS = ['confirmed_cases', 'dead_cases', 'recovered_cases', 'active_cases']
+
+
+def create_snapshot(apps, schema_editor):
+    """ Create the latest snapshot with the latest date of every country and the states rollup """
+    CountryDaily = apps.get_model('app_covid19data', 'CountryDaily')
+    StateLatest = apps.get_model('app_covid19data', 'StateLatest')
+    LatestSnapshot = apps.get_model('app_covid19data', 'LatestSnapshot')
+
+    latest_date = CountryDaily.objects.filter(country=OuterRef('country')).order_by('-date').values('date')[:1]
+    rows = list(CountryDaily.objects.filter(date=Subquery(latest_date)).values('country', 'date', *CASES_FIELDS))
+    rows.extend({**row, 'state': row['state'] or ''}
+                for row in StateLatest.objects.values('country', 'state', 'date', *CASES_FIELDS))
+    LatestSnapshot.objects.bulk_create([LatestSnapshot(**row) for row in rows], batch_size=1000)
+
+    LatestSnapshot.objects.update(**{
+        f'{tax}_tax': Case(When(confirmed_cases__gt=0,
+                                then=ExpressionWrapper(Cast(field, FloatField()) * 100 / F('confirmed_cases'),
+                                                       output_field=FloatField())),
+                           default=None, output_field=FloatField())
+        for tax, field in [('mortality', 'dead_cases'), ('recovered', 'recovered_cases')]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0011_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('country', models.TextField(max_length=100)),
+                ('state', models.TextField(blank=True, max_length=100, null=True)),
+                ('date', models.DateField()),
+                ('confirmed_cases', models.IntegerField(blank=True, null=True)),
+                ('dead_cases', models.IntegerField(blank=True, null=True)),
+                ('recovered_cases', models.IntegerField(blank=True, null=True)),
+                ('active_cases', models.IntegerField(blank=True, null=True)),
+                ('mortality_tax', models.FloatField(blank=True, null=True)),
+                ('recovered_tax', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(create_snapshot, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='StateLatest',
+        ),
+        migrations.RemoveIndex(
+            model_name='countrydaily',
+            name='countrydaily_dead_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='countrydaily',
+            name='countrydaily_conf_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='countrydaily',
+            name='countrydaily_mort_rank_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='countrydaily',
+            name='countrydaily_reco_rank_idx',
+        ),
+        migrations.AddIndex(
+            model_name='latestsnapshot',
+            index=models.Index(fields=['country', 'state'], name='snapshot_country_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='latestsnapshot',
+            index=models.Index(condition=models.Q(('state__isnull', True)), fields=['-dead_cases', 'country'], name='snapshot_dead_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='latestsnapshot',
+            index=models.Index(condition=models.Q(('state__isnull', True)), fields=['-confirmed_cases', 'country'], name='snapshot_conf_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='latestsnapshot',
+            index=models.Index(condition=models.Q(('state__isnull', True)), fields=['-mortality_tax', 'country'], name='snapshot_mort_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='latestsnapshot',
+            index=models.Index(condition=models.Q(('state__isnull', True)), fields=['-recovered_tax', 'country'], name='snapshot_reco_rank_idx'),
+        ),
+    ]
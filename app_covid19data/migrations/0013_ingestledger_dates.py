@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0012_latestsnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestledger',
+            name='first_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ingestledger',
+            name='last_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_covid19data', '0013_ingestledger_dates'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='datacovid19item',
+            name='item_update_date_idx',
+        ),
+    ]
@@ -4,14 +4,37 @@ from django.db import models
 from django.utils.timezone import now
 
 
+class Country(models.Model):
+    """ Class to store every country with data, with its canonical name and its key in lowercase for searching """
+    name = models.TextField(max_length=100, unique=True)
+    key = models.TextField(max_length=100, unique=True)
+
+    def __str__(self):
+        return f'Country {self.name}'
+
+
+class Location(models.Model):
+    """ Class to store every location (state of a country) with its coordinates """
+    country = models.ForeignKey(Country, on_delete=models.PROTECT, related_name='locations')
+    # Without state the value is '' because NULL values are always different in the unique constraint
+    state = models.TextField(max_length=100, blank=True, default='')
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country', 'state'], name='unique_location_country_state'),
+        ]
+
+    def __str__(self):
+        return f'{self.country.name}/{self.state} Lat/Long: {self.latitude}/{self.longitude}'
+
+
 class DataCovid19Item(models.Model):
     """ Class to store the COVID data """
-    # About localization
-    country = models.TextField(max_length=100)
-    state = models.TextField(max_length=100, null=True)
+    # About localization, the country, state and coordinates are in the location
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='items')
     date = models.DateField(null=True, blank=True)
-    latitude = models.FloatField(null=True, blank=True)
-    longitude = models.FloatField(null=True, blank=True)
     # About data incomes
     confirmed_cases = models.IntegerField(null=True, blank=True, default=0)
     dead_cases = models.IntegerField(null=True, blank=True, default=0)
@@ -22,9 +45,21 @@ class DataCovid19Item(models.Model):
     # About update date
     update_date = models.DateTimeField(default=now)
 
+    class Meta:
+        constraints = [
+            # Natural key for the incremental ingest, one row for every location and day
+            # The data of a location ordered by date is read with its index
+            models.UniqueConstraint(fields=['location', 'date'], name='unique_location_date'),
+        ]
+        indexes = [
+            # Data of a date with the amounts by location, the aggregation for a date reads only the index.
+            # It is also the index for the queries by date or max date and for the retention by date
+            models.Index(fields=['date', 'location', 'confirmed_cases', 'dead_cases', 'recovered_cases',
+                                 'active_cases'], name='item_date_location_cases_idx'),
+        ]
+
     def __str__(self):
-        return f'Daily data from {self.country}/{self.state} at {self.date}' \
-               f'Lat/Long: {self.latitude}/{self.longitude}' \
+        return f'Daily data from {self.location} at {self.date}' \
                f'\nConfirmed: {self.confirmed_cases}' \
                f'\nDeaths: {self.dead_cases}' \
                f'\nRecovered: {self.recovered_cases}' \
@@ -54,3 +89,117 @@ class DataCovid19Item(models.Model):
                           f'Arguments:\n {err.args}')
 
 
+class IngestLedger(models.Model):
+    """ Class to store every daily file loaded in DB, for loading again only the new or changed files """
+    url = models.CharField(max_length=255, unique=True)
+    source_date = models.DateField(null=True, blank=True)
+    # Dates of the data in the file, for loading it again when the data of those dates is deleted
+    first_date = models.DateField(null=True, blank=True)
+    last_date = models.DateField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64)
+    row_count = models.IntegerField(default=0)
+    update_date = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f'File {self.url} of {self.source_date} with {self.row_count} rows' \
+               f'\nHash: {self.content_hash}'
+
+
+class GlobalDaily(models.Model):
+    """ Class to store the global amounts for every date, rebuilt by the ingest """
+    date = models.DateField(unique=True)
+    confirmed_cases = models.IntegerField(null=True, blank=True)
+    dead_cases = models.IntegerField(null=True, blank=True)
+    recovered_cases = models.IntegerField(null=True, blank=True)
+    active_cases = models.IntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Global data at {self.date}'
+
+
+class CountryDaily(models.Model):
+    """ Class to store the amounts of every country for every date, rebuilt by the ingest """
+    country = models.TextField(max_length=100)
+    date = models.DateField()
+    confirmed_cases = models.IntegerField(null=True, blank=True)
+    dead_cases = models.IntegerField(null=True, blank=True)
+    recovered_cases = models.IntegerField(null=True, blank=True)
+    active_cases = models.IntegerField(null=True, blank=True)
+    mortality_tax = models.FloatField(null=True, blank=True)
+    recovered_tax = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country', 'date'], name='unique_countrydaily_country_date'),
+        ]
+
+    def __str__(self):
+        return f'Data from {self.country} at {self.date}'
+
+
+class LatestSnapshot(models.Model):
+    """ Class to store the latest amounts and taxes of every country and of its states at the latest date of the
+    country, rebuilt by the ingest. The row of the whole country has no state """
+    country = models.TextField(max_length=100)
+    state = models.TextField(max_length=100, null=True, blank=True)
+    date = models.DateField()
+    confirmed_cases = models.IntegerField(null=True, blank=True)
+    dead_cases = models.IntegerField(null=True, blank=True)
+    recovered_cases = models.IntegerField(null=True, blank=True)
+    active_cases = models.IntegerField(null=True, blank=True)
+    mortality_tax = models.FloatField(null=True, blank=True)
+    recovered_tax = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['country', 'state'], name='snapshot_country_state_idx'),
+            # Rank of the countries by every sort, with the country for the keyset pagination
+            models.Index(fields=['-dead_cases', 'country'], name='snapshot_dead_rank_idx',
+                         condition=models.Q(state__isnull=True)),
+            models.Index(fields=['-confirmed_cases', 'country'], name='snapshot_conf_rank_idx',
+                         condition=models.Q(state__isnull=True)),
+            models.Index(fields=['-mortality_tax', 'country'], name='snapshot_mort_rank_idx',
+                         condition=models.Q(state__isnull=True)),
+            models.Index(fields=['-recovered_tax', 'country'], name='snapshot_reco_rank_idx',
+                         condition=models.Q(state__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f'Data from {self.country}/{self.state} at {self.date}' if self.state is not None else \
+            f'Data from {self.country} at {self.date}'
+
+
+class DailyTrend(models.Model):
+    """ Class to store the new cases of every country and Global for every date and their rolling means,
+    calculated by the ingest """
+    country = models.TextField(max_length=100)
+    date = models.DateField()
+    new_confirmed_cases = models.IntegerField(null=True, blank=True)
+    new_dead_cases = models.IntegerField(null=True, blank=True)
+    new_recovered_cases = models.IntegerField(null=True, blank=True)
+    new_active_cases = models.IntegerField(null=True, blank=True)
+    avg7_confirmed_cases = models.FloatField(null=True, blank=True)
+    avg7_dead_cases = models.FloatField(null=True, blank=True)
+    avg7_recovered_cases = models.FloatField(null=True, blank=True)
+    avg7_active_cases = models.FloatField(null=True, blank=True)
+    avg14_confirmed_cases = models.FloatField(null=True, blank=True)
+    avg14_dead_cases = models.FloatField(null=True, blank=True)
+    avg14_recovered_cases = models.FloatField(null=True, blank=True)
+    avg14_active_cases = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['country', 'date'], name='unique_dailytrend_country_date'),
+        ]
+
+    def __str__(self):
+        return f'Trend of {self.country} at {self.date}'
+
+
+class DataGeneration(models.Model):
+    """ Class to store the generation of the data, the ingest increases it after every load with changes """
+    generation = models.IntegerField(default=0)
+    update_date = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f'Data generation {self.generation} at {self.update_date}'
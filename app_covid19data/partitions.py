@@ -0,0 +1,190 @@
+# by Richi Rod AKA @richionline / falken20
+
+import logging
+import os
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import DataCovid19Item
+
+# Months after the current one with their partition created in advance
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+TABLE = DataCovid19Item._meta.db_table
+# Partitions are called like the table with the month: app_covid19data_datacovid19item_y2020m03
+PARTITION_PATTERN = re.compile(rf'^{TABLE}_y(\d{{4}})m(\d{{2}})$')
+
+
+def get_month(_date):
+    """ Return the first day of the month of a date """
+    return _date.replace(day=1)
+
+
+def add_months(_month, _months=1):
+    """ Return the first day of the month some months after a month """
+    months = _month.year * 12 + _month.month - 1 + _months
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def get_months(_date_from, _date_to):
+    """ Return the first day of every month between two dates, both included """
+    month, months = get_month(_date_from), []
+    while month <= _date_to:
+        months.append(month)
+        month = add_months(month)
+    return months
+
+
+def get_partition_name(_month):
+    """ Return the name of the partition of a month """
+    return f'{TABLE}_y{_month.year:04d}m{_month.month:02d}'
+
+
+def is_partitioned():
+    """ Return True if the table of the data is partitioned by date, only possible in PostgreSQL """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_partitions():
+    """ Return a dict with the first day of the month of every partition and its name """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                       'WHERE i.inhparent = %s::regclass', [TABLE])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partitions(_date_from, _date_to):
+    """
+    Create the partitions of the months between two dates which do not exist yet
+    :param _date_from: Date from
+    :param _date_to: Date to, included
+    :return: List of the names of the partitions created
+    """
+    existing, created = get_partitions(), []
+    with connection.cursor() as cursor:
+        for month in get_months(_date_from, _date_to):
+            if month in existing:
+                continue
+            name = get_partition_name(month)
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(name)} '
+                           f'PARTITION OF {connection.ops.quote_name(TABLE)} '
+                           f'FOR VALUES FROM (%s) TO (%s)', [month, add_months(month)])
+            created.append(name)
+
+    if created:
+        logging.info(f'{os.getenv("ID_LOG", "")} Partitions created: {created}')
+    return created
+
+
+def ensure_partitions(_dates):
+    """
+    Create the partitions for saving data of some dates, if the table is partitioned
+    :param _dates: List of dates
+    """
+    if _dates and is_partitioned():
+        create_partitions(min(_dates), max(_dates))
+
+
+def drop_partitions(_date_before):
+    """
+    Drop the partitions whose whole month is before a date, without deleting rows one by one
+    :param _date_before: First date to keep
+    :return: List of the names of the partitions dropped
+    """
+    dropped = []
+    with connection.cursor() as cursor:
+        for month, name in get_partitions().items():
+            if add_months(month) <= _date_before:
+                cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
+                dropped.append(name)
+
+    if dropped:
+        logging.info(f'{os.getenv("ID_LOG", "")} Partitions dropped: {dropped}')
+    return dropped
+
+
+def truncate_partition(_month):
+    """
+    Empty the partition of a month before reloading it, without deleting rows one by one
+    :param _month: Any date of the month
+    :return: Name of the partition, None if it does not exist
+    """
+    name = get_partitions().get(get_month(_month))
+    if name:
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE TABLE {connection.ops.quote_name(name)}')
+    return name
+
+
+def partition_table(_months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Change the table of the data to a table partitioned by month of the date, in one transaction.
+    The rows are copied to the new table and the indexes and constraints are created again with the same
+    names. The primary key has to include the date, so it is (id, date).
+    :param _months_ahead: Months after the current one with their partition created in advance
+    :return: List of the names of the partitions created
+    """
+    table = connection.ops.quote_name(TABLE)
+    new_table = connection.ops.quote_name(f'{TABLE}_partitioned')
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+            cursor.execute(f'SELECT MIN(date), MAX(date) FROM {table}')
+            date_from, date_to = cursor.fetchone()
+            today = date.today()
+            date_from = min(date_from or today, today)
+            date_to = add_months(get_month(max(date_to or today, today)), _months_ahead)
+
+            # The constraints are created again with their definition, the rest of indexes with theirs
+            cursor.execute('SELECT conname, contype, pg_get_constraintdef(oid), conindid FROM pg_constraint '
+                           'WHERE conrelid = %s::regclass ORDER BY contype DESC', [TABLE])
+            constraints = cursor.fetchall()
+            cursor.execute('SELECT indexrelid, pg_get_indexdef(indexrelid) FROM pg_index '
+                           'WHERE indrelid = %s::regclass', [TABLE])
+            constraint_indexes = {constraint[3] for constraint in constraints}
+            indexes = [row[1] for row in cursor.fetchall() if row[0] not in constraint_indexes]
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+            sequence = cursor.fetchone()[0]
+
+            cursor.execute(f'CREATE TABLE {new_table} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (date)')
+            for month in get_months(date_from, date_to):
+                cursor.execute(f'CREATE TABLE {connection.ops.quote_name(get_partition_name(month))} '
+                               f'PARTITION OF {new_table} FOR VALUES FROM (%s) TO (%s)',
+                               [month, add_months(month)])
+            cursor.execute(f'INSERT INTO {new_table} SELECT * FROM {table}')
+
+            # The sequence of the ids is kept for the new table
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+            cursor.execute(f'DROP TABLE {table}')
+            cursor.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+            for name, constraint_type, definition, _ in constraints:
+                if constraint_type == 'p':
+                    definition = 'PRIMARY KEY (id, date)'
+                cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {connection.ops.quote_name(name)} {definition}')
+            for definition in indexes:
+                cursor.execute(definition)
+
+        partitions = list(get_partitions().values())
+        logging.info(f'{os.getenv("ID_LOG", "")} Table {TABLE} partitioned in {len(partitions)} partitions')
+        return partitions
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
@@ -0,0 +1,178 @@
+# by Richi Rod AKA @richionline / falken20
+
+import logging
+import os
+from datetime import timedelta
+import pandas as pd
+from django.db import transaction
+from django.db.models import Sum, Min, Case, When, F, FloatField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Cast
+from .models import DataCovid19Item, GlobalDaily, CountryDaily, LatestSnapshot, DailyTrend, Country
+
+CASES_FIELDS = ['confirmed_cases', 'dead_cases', 'recovered_cases', 'active_cases']
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', 1000))
+# Country of the global amounts in the trends
+GLOBAL = 'Global'
+# Days of the rolling means of the new cases
+TREND_WINDOWS = [7, 14]
+
+
+def get_country_name(_country):
+    """
+    Return the name of a country in the rollups, searched by its key in lowercase like in the detail view
+    :param _country: Country name in any case or Global
+    :return: Name of the country, GLOBAL for the global amounts, None if the country does not exist
+    """
+    if _country.upper() == GLOBAL.upper():
+        return GLOBAL
+    return Country.objects.filter(key=_country.lower()).values_list('name', flat=True).first()
+
+
+def sum_cases():
+    """ Return the aggregations for adding every cases field """
+    return {field: Sum(field) for field in CASES_FIELDS}
+
+
+def rate_cases():
+    """
+    Return the annotations for the mortality and recovered taxes (%), calculated in the DB in double
+    precision. Without confirmed cases the taxes are NULL instead of a division by zero.
+    """
+    return {f'{tax}_tax': Case(When(confirmed_cases__gt=0,
+                                    then=ExpressionWrapper(Cast(field, FloatField()) * 100 / F('confirmed_cases'),
+                                                           output_field=FloatField())),
+                               default=None, output_field=FloatField())
+            for tax, field in [('mortality', 'dead_cases'), ('recovered', 'recovered_cases')]}
+
+
+def refresh_latest_snapshot(_countries=None):
+    """
+    Rebuild the latest snapshot of the countries: the amounts and taxes of every country and of its states
+    at the latest date of the country. It runs in the transaction of the rollups, so the readers see the old
+    snapshot or the new one.
+    :param _countries: List of countries to rebuild, all the countries if None
+    """
+    latest_date = CountryDaily.objects.filter(country=OuterRef('country')).order_by('-date').values('date')[:1]
+    countries = CountryDaily.objects.filter(date=Subquery(latest_date))
+    states = DataCovid19Item.objects.filter(
+        date=Subquery(CountryDaily.objects.filter(country=OuterRef('location__country__name'))
+                      .order_by('-date').values('date')[:1]))
+    snapshot = LatestSnapshot.objects.all()
+    if _countries is not None:
+        countries = countries.filter(country__in=_countries)
+        states = states.filter(location__country__name__in=_countries)
+        snapshot = snapshot.filter(country__in=_countries)
+
+    snapshot.delete()
+    rows = list(countries.values('country', 'date', *CASES_FIELDS, 'mortality_tax', 'recovered_tax'))
+    rows.extend(states.values('date', *CASES_FIELDS, country=F('location__country__name'),
+                              state=F('location__state')).annotate(**rate_cases()))
+    LatestSnapshot.objects.bulk_create([LatestSnapshot(**row) for row in rows], batch_size=BATCH_SIZE)
+
+
+def refresh_trends(_dates=None):
+    """
+    Rebuild the new cases and their rolling means of every country and Global from the first date changed
+    until the longest window after the last one, the dates whose trends use the dates changed. The dates of
+    the longest window before the first one are read only for calculating the new rows. When a country
+    has no data in those dates, its new cases in the first date are all its cases.
+    :param _dates: List of dates changed, all the dates if None
+    """
+    date_to = None
+    if _dates is not None:
+        date_from = min(_dates, default=None)
+        if date_from is not None:
+            date_to = max(_dates) + timedelta(days=max(TREND_WINDOWS))
+    else:
+        date_from = CountryDaily.objects.aggregate(min_date=Min('date'))['min_date']
+    if date_from is None:
+        return
+
+    date_window = date_from - timedelta(days=max(TREND_WINDOWS))
+    country_daily = CountryDaily.objects.filter(date__gte=date_window)
+    global_daily = GlobalDaily.objects.filter(date__gte=date_window)
+    trends = DailyTrend.objects.filter(date__gte=date_from)
+    if date_to is not None:
+        country_daily = country_daily.filter(date__lte=date_to)
+        global_daily = global_daily.filter(date__lte=date_to)
+        trends = trends.filter(date__lte=date_to)
+
+    columns = ['country', 'date', *CASES_FIELDS]
+    df_country = pd.DataFrame.from_records(country_daily.values_list(*columns), columns=columns)
+    df_global = pd.DataFrame.from_records(global_daily.values_list('date', *CASES_FIELDS), columns=columns[1:])
+    df_global.insert(0, 'country', GLOBAL)
+    df_trends = pd.concat([df_country, df_global], ignore_index=True).astype({field: 'float64'
+                                                                              for field in CASES_FIELDS})
+    df_trends['date'] = pd.to_datetime(df_trends['date'])
+    df_trends = df_trends.sort_values(['country', 'date'], ignore_index=True)
+
+    # Vectorized per country: new cases are the difference with the previous date, the means are of the
+    # new cases in the last days of every date (in days of calendar, there are dates without data)
+    new_fields = [f'new_{field}' for field in CASES_FIELDS]
+    df_new = df_trends.groupby('country', sort=True)[CASES_FIELDS].diff()
+    # Only the first date of every country has all its cases as new cases, a NULL inside the series is NULL
+    first = df_trends.groupby('country', sort=True).cumcount() == 0
+    df_trends[new_fields] = df_new.mask(first, df_trends[CASES_FIELDS], axis=0).to_numpy()
+    for window in TREND_WINDOWS:
+        df_means = df_trends.groupby('country', sort=True).rolling(f'{window}D', on='date')[new_fields].mean()
+        df_trends[[f'avg{window}_{field}' for field in CASES_FIELDS]] = df_means.round(2).to_numpy()
+
+    df_trends = df_trends[df_trends['date'] >= pd.Timestamp(date_from)]
+    df_trends['date'] = df_trends['date'].dt.date
+    df_trends[new_fields] = df_trends[new_fields].round().astype('Int64')
+    df_trends = df_trends.drop(columns=CASES_FIELDS).astype(object)
+    df_trends = df_trends.where(df_trends.notna(), None)
+
+    trends.delete()
+    DailyTrend.objects.bulk_create([DailyTrend(**row) for row in df_trends.to_dict('records')],
+                                   batch_size=BATCH_SIZE)
+
+
+def refresh_rollups(_dates=None):
+    """
+    Rebuild the rollups (global by date, country by date, latest snapshot and trends) for some dates, in one
+    transaction. Only the countries with data or rollups in the dates are rebuilt in the latest snapshot.
+    :param _dates: List of dates to rebuild, all the dates if None
+    """
+    try:
+        logging.info(f'{os.getenv("ID_LOG", "")} Refreshing rollups for dates: {_dates or "all"}')
+
+        with transaction.atomic():
+            facts = DataCovid19Item.objects.all()
+            country_daily = CountryDaily.objects.all()
+            global_daily = GlobalDaily.objects.all()
+            if _dates is not None:
+                facts = facts.filter(date__in=_dates)
+                country_daily = country_daily.filter(date__in=_dates)
+                global_daily = global_daily.filter(date__in=_dates)
+
+            # The countries of the rollups of the dates too, their data could have been deleted
+            countries = None if _dates is None else \
+                {*facts.values_list('location__country__name', flat=True).distinct().order_by(),
+                 *country_daily.values_list('country', flat=True).distinct().order_by()}
+
+            country_daily.delete()
+            CountryDaily.objects.bulk_create(
+                [CountryDaily(**row) for row in facts.values('date', country=F('location__country__name'))
+                 .annotate(**sum_cases()).order_by()],
+                batch_size=BATCH_SIZE)
+            # The taxes are saved for sorting the rank by them with an index
+            country_daily.update(**rate_cases())
+
+            global_daily.delete()
+            GlobalDaily.objects.bulk_create(
+                [GlobalDaily(**row) for row in country_daily.values('date').annotate(**sum_cases()).order_by()],
+                batch_size=BATCH_SIZE)
+
+            refresh_latest_snapshot(None if countries is None else list(countries))
+
+            refresh_trends(_dates)
+
+        logging.info(f'{os.getenv("ID_LOG", "")} Rollups refreshed successfully')
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
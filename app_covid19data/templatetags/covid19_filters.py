@@ -0,0 +1,21 @@
+# by Richi Rod AKA @richionline / falken20
+
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def thousands(value):
+    """ Format an amount with thousands separators, for example 1,234,567. Without value it is empty """
+    if value is None or value == '':
+        return ''
+    return f'{int(value):,d}'
+
+
+@register.filter
+def decimals(value):
+    """ Format a rate with thousands separators and 2 decimals, for example 1,234.57. Without value it is empty """
+    if value is None or value == '':
+        return ''
+    return f'{float(value):,.2f}'
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from app_covid19data import caching, views
+from app_covid19data.rollups import refresh_rollups
+from app_covid19data.tests.utils import make_item
+
+
+class Covid19CachingTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for state in ['Madrid', 'Toledo']:
+            make_item('Spain', state, date=timezone.now().date(), dead_cases=1, confirmed_cases=1, recovered_cases=1)
+        refresh_rollups()
+
+    def test_data_generation(self):
+        self.assertEqual(caching.get_data_generation(), 0)
+        self.assertEqual(caching.bump_data_generation(), 1)
+        self.assertEqual(caching.get_data_generation(), 1)
+
+    def test_cache_view(self):
+        url = reverse(views.global_view)
+        self.client.get(url)
+        # The second request is served from cache without queries
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'Spain')
+
+        # After a new load the view shows the new data
+        make_item('France', date=timezone.now().date(), dead_cases=1, confirmed_cases=1)
+        refresh_rollups()
+        self.assertNotContains(self.client.get(url), 'France')
+        caching.bump_data_generation()
+        self.assertContains(self.client.get(url), 'France')
+
+    def test_cache_resume_view(self):
+        url = reverse(views.resume_view)
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            resp = self.client.get(url)
+        self.assertContains(resp, 'csrfmiddlewaretoken')
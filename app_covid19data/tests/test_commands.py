@@ -0,0 +1,142 @@
+import os
+import tempfile
+from datetime import date
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from app_covid19data import archive, caching, jobs, partitions
+from app_covid19data.management.commands import run_jobs
+from app_covid19data.models import DataCovid19Item, CountryDaily, LatestSnapshot
+from app_covid19data.tests.test_cron import create_files
+from cron import cron_covid19, csv_cache
+
+
+class Covid19CommandsTest(TestCase):
+
+    def test_benchmark_ingest(self):
+        out = StringIO()
+        call_command('benchmark_ingest', days=3, rows=10, stdout=out)
+        for strategy in ['ROW', 'BULK', 'COPY', 'UPSERT']:
+            self.assertIn(f'{strategy:<5} 30 rows', out.getvalue())
+        # Every strategy is rolled back
+        self.assertEqual(DataCovid19Item.objects.count(), 0)
+
+    def test_refresh_rollups(self):
+        # The cache is not rolled back with the DB after every test
+        cache.clear()
+        generation = caching.get_data_generation()
+        call_command('refresh_rollups', stdout=StringIO())
+        # The data in cache of the views is not used anymore
+        self.assertEqual(caching.get_data_generation(), generation + 1)
+
+    def test_partition_data(self):
+        out = StringIO()
+        call_command('partition_data', convert=True, stdout=out)
+        # Without PostgreSQL the command does nothing
+        self.assertIn('only available in PostgreSQL', out.getvalue())
+        self.assertFalse(partitions.is_partitioned())
+
+    def test_partition_months(self):
+        self.assertEqual(partitions.get_months(date(2020, 11, 15), date(2021, 2, 1)),
+                         [date(2020, 11, 1), date(2020, 12, 1), date(2021, 1, 1), date(2021, 2, 1)])
+        self.assertEqual(partitions.add_months(date(2020, 12, 1), 3), date(2021, 3, 1))
+        self.assertEqual(partitions.get_partition_name(date(2020, 3, 1)), 'app_covid19data_datacovid19item_y2020m03')
+
+    @skipUnless(archive.pa, 'pyarrow is not installed')
+    def test_rebuild_from_archive(self):
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(csv_cache, 'CSV_CACHE_DIR', os.path.join(folder, 'cache')), \
+                mock.patch.object(archive, 'ARCHIVE_DIR', os.path.join(folder, 'archive')):
+            with self.assertRaises(CommandError):
+                call_command('rebuild_from_archive', stdout=StringIO())
+
+            cron_covid19.reset_locations()
+            cron_covid19.load_data_urls(create_files(folder, 3))
+            items = list(DataCovid19Item.objects.order_by('date', 'location').values_list('location', 'date',
+                                                                                          'dead_cases'))
+            DataCovid19Item.objects.all().delete()
+            CountryDaily.objects.all().delete()
+
+            out = StringIO()
+            call_command('rebuild_from_archive', stdout=out)
+            self.assertIn('9 rows of 3 dates loaded', out.getvalue())
+            self.assertEqual(list(DataCovid19Item.objects.order_by('date', 'location')
+                                  .values_list('location', 'date', 'dead_cases')), items)
+            # The rollups are rebuilt
+            self.assertEqual(CountryDaily.objects.get(date='2020-11-03').dead_cases, 3)
+            self.assertEqual(LatestSnapshot.objects.filter(date='2020-11-03').count(), 4)
+
+            # Only some dates
+            call_command('rebuild_from_archive', date_from=date(2020, 11, 2), date_to=date(2020, 11, 2),
+                         stdout=out)
+            self.assertIn('3 rows of 1 dates loaded', out.getvalue())
+            self.assertEqual(DataCovid19Item.objects.count(), 9)
+
+    def test_run_jobs_ingest_failed(self):
+        graphs_job, heat_map_job = mock.Mock(), mock.Mock()
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(jobs, 'JOBS_LOCK_FILE', os.path.join(folder, 'jobs.lock')), \
+                mock.patch.object(csv_cache, 'CSV_CACHE_DIR', os.path.join(folder, 'cache')), \
+                mock.patch.object(cron_covid19, 'create_list_urls', return_value=create_files(folder, 2)), \
+                mock.patch.object(cron_covid19, 'save_file', side_effect=ValueError('Error saving the file')), \
+                mock.patch.dict(run_jobs.JOBS, {'graphs': (graphs_job, ['ingest']),
+                                                'heat_map': (heat_map_job, ['ingest'])}):
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('run_jobs', stdout=out)
+
+        # The error saving a file fails the ingest and the jobs which depend on it are skipped
+        self.assertRegex(out.getvalue(), r'ingest\s+failed')
+        self.assertRegex(out.getvalue(), r'graphs\s+skipped')
+        self.assertRegex(out.getvalue(), r'heat_map\s+skipped')
+        graphs_job.assert_not_called()
+        heat_map_job.assert_not_called()
+
+    def test_run_jobs(self):
+        calls = []
+
+        def fail():
+            raise ValueError('Error in the job')
+
+        test_jobs = {'graphs': (lambda: calls.append('graphs'), ['ingest']),
+                     'ingest': (lambda: calls.append('ingest'), []),
+                     'heat_map': (fail, ['ingest']),
+                     'publish': (lambda: calls.append('publish'), ['heat_map', 'graphs'])}
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(jobs, 'JOBS_LOCK_FILE', os.path.join(folder, 'jobs.lock')), \
+                mock.patch.dict(run_jobs.JOBS, test_jobs, clear=True):
+            out = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('run_jobs', stdout=out)
+            # Every job after its dependencies, and the jobs after a failed job are skipped
+            self.assertEqual(calls, ['ingest', 'graphs'])
+            self.assertRegex(out.getvalue(), r'heat_map\s+failed')
+            self.assertRegex(out.getvalue(), r'publish\s+skipped')
+
+            # Only the jobs indicated with their dependencies
+            calls.clear()
+            call_command('run_jobs', jobs='graphs', stdout=StringIO())
+            self.assertEqual(calls, ['ingest', 'graphs'])
+
+            # Only one run at the same time
+            calls.clear()
+            out = StringIO()
+            with jobs.jobs_lock() as acquired:
+                self.assertTrue(acquired)
+                call_command('run_jobs', stdout=out)
+            self.assertIn('this run is skipped', out.getvalue())
+            self.assertEqual(calls, [])
+
+            with self.assertRaises(CommandError):
+                call_command('run_jobs', jobs='other', stdout=StringIO())
+
+    def test_jobs_order(self):
+        self.assertEqual(jobs.get_order({'b': (None, ['a']), 'a': (None, [])}), ['a', 'b'])
+        with self.assertRaises(ValueError):
+            jobs.get_order({'a': (None, ['b']), 'b': (None, ['a'])})
+        with self.assertRaises(ValueError):
+            jobs.get_order({'a': (None, ['c'])})
@@ -0,0 +1,304 @@
+import os
+import pathlib
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
+
+import numpy as np
+import pandas as pd
+from django.test import TestCase
+
+from app_covid19data.models import DataCovid19Item, IngestLedger, GlobalDaily, CountryDaily, LatestSnapshot, \
+    DailyTrend, Country, Location
+from app_covid19data import archive, rollups
+from cron import cron_covid19, csv_cache
+
+
+def create_df(rows=3, last_update='2020-11-19 05:25:55'):
+    """ Create a dataframe with the same columns than a daily report file """
+    return pd.DataFrame({'Province_State': [f'stateTest{row}' for row in range(rows - 1)] + [np.nan],
+                         'Country_Region': ['countryTest'] * rows,
+                         'Last_Update': [last_update] * rows,
+                         'Latitude': [1.5] * (rows - 1) + [np.nan],
+                         'Longitude': [2.5] * rows,
+                         'Confirmed': [10.0] * (rows - 1) + [np.nan],
+                         'Deaths': [1] * rows,
+                         'Recovered': [5] * rows})
+
+
+def create_files(_folder, _days=5):
+    """ Create a CSV file for every day in a folder and return the file:// urls """
+    list_urls = []
+    for day in range(1, _days + 1):
+        path = pathlib.Path(_folder, f'{day}.csv')
+        create_df(last_update=f'2020-11-{day:02d} 05:25:55').to_csv(path, index=False)
+        list_urls.append(path.as_uri())
+    return list_urls
+
+
+class Covid19CronTest(TestCase):
+
+    def setUp(self):
+        # Every test with its own CSV cache
+        self.cache_folder = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(csv_cache, 'CSV_CACHE_DIR', self.cache_folder.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # And its own archive
+        patcher = mock.patch.object(archive, 'ARCHIVE_DIR', os.path.join(self.cache_folder.name, 'archive'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.cache_folder.cleanup)
+        # The locations in the lookup of other tests were rolled back
+        cron_covid19.reset_locations()
+
+    def test_prepare_data(self):
+        df_model = cron_covid19.prepare_data(create_df())
+        row = df_model.to_dict('records')[-1]
+        self.assertEqual(str(row['date']), '2020-11-19')
+        self.assertEqual(Location.objects.get(id=row['location_id']).state, '')
+        self.assertIsNone(Location.objects.get(id=row['location_id']).latitude)
+        self.assertIsNone(row['confirmed_cases'])
+        self.assertEqual(row['active_cases'], 0)
+        self.assertIsInstance(df_model.to_dict('records')[0]['confirmed_cases'], int)
+
+    def test_read_csv(self):
+        # Old names of the columns and columns not used
+        content = b'FIPS,Province/State,Country/Region,Last Update,Confirmed,Deaths,Recovered,Lat,Long_,' \
+                  b'Incident_Rate,Case-Fatality_Ratio,Combined_Key\n' \
+                  b'1,,Spain,1/22/2020 17:00,10,1,,40.4,-3.7,5.5,0.1,Spain\n' \
+                  b'2,Madrid,Spain,2020-01-22T18:00:00,20,2,3,,,,,"Madrid, Spain"\n'
+        df = cron_covid19.read_csv(content)
+        self.assertEqual(list(df.columns), ['Province_State', 'Country_Region', 'Last_Update', 'Confirmed',
+                                            'Deaths', 'Recovered', 'Latitude', 'Longitude', 'Incidence_Rate',
+                                            'Case_Fatality_Ratio'])
+        self.assertEqual(df['Country_Region'].dtype, 'category')
+        self.assertEqual(df['Recovered'].dtype, 'Int64')
+        self.assertEqual(list(cron_covid19.parse_dates(df['Last_Update']).astype(str)), ['2020-01-22'] * 2)
+
+        # Cases which are not integers
+        df = cron_covid19.read_csv(b'Country_Region,Last_Update,Confirmed,Deaths,Recovered\n'
+                                   b'Spain,2020-11-19,10.5,1,2\n')
+        self.assertEqual(df['Confirmed'][0], 10.5)
+
+    def test_prepare_data_natural_key(self):
+        # Several rows for the same state, like the counties in US
+        df = pd.concat([create_df(), create_df()])
+        df_model = cron_covid19.prepare_data(df)
+        self.assertEqual(len(df_model), 3)
+        self.assertEqual(df_model.to_dict('records')[0]['confirmed_cases'], 20)
+        self.assertIsNone(df_model.to_dict('records')[-1]['confirmed_cases'])
+
+    def test_prepare_data_without_date(self):
+        # A row without date is not parsed with the date of other row
+        df = create_df()
+        df.loc[2, 'Last_Update'] = np.nan
+        self.assertEqual(list(cron_covid19.parse_dates(df['Last_Update'])),
+                         [date(2020, 11, 19), date(2020, 11, 19), None])
+        self.assertEqual(len(cron_covid19.prepare_data(df)), 2)
+
+        # A file without any date
+        df['Last_Update'] = np.nan
+        self.assertEqual(list(cron_covid19.parse_dates(df['Last_Update'])), [None] * 3)
+        self.assertEqual(len(cron_covid19.prepare_data(df)), 0)
+
+    def test_get_location_ids(self):
+        cron_covid19.prepare_data(create_df())
+        self.assertEqual(Location.objects.get(state='stateTest0').latitude, 1.5)
+
+        # The same country with other case, the coordinates are updated
+        df = create_df()
+        df['Country_Region'] = 'COUNTRYTEST'
+        df['Latitude'] = 3.5
+        with self.assertNumQueries(1):
+            df_model = cron_covid19.prepare_data(df)
+        self.assertEqual(Location.objects.count(), 3)
+        self.assertEqual(list(Country.objects.values_list('name', flat=True)), ['countryTest'])
+        self.assertEqual(Location.objects.get(id=df_model['location_id'][0]).latitude, 3.5)
+
+    def test_save_data_upsert(self):
+        cron_covid19.save_data_upsert(create_df(rows=5), batch_size=2)
+        df = create_df(rows=6)
+        df['Deaths'] = 7
+        cron_covid19.save_data_upsert(df, batch_size=2)
+        self.assertEqual(DataCovid19Item.objects.count(), 6)
+        self.assertEqual(DataCovid19Item.objects.filter(dead_cases=7).count(), 6)
+
+    def test_save_data_row(self):
+        self.assertEqual(str(cron_covid19.save_data(create_df())), '2020-11-19')
+        self.assertEqual(DataCovid19Item.objects.count(), 3)
+        # A file without rows to save
+        df = create_df()
+        df['Last_Update'] = np.nan
+        self.assertIsNone(cron_covid19.save_data(df))
+
+    def test_save_data_bulk(self):
+        date_saved = cron_covid19.save_data_bulk(create_df(rows=5), batch_size=2)
+        self.assertEqual(str(date_saved), '2020-11-19')
+        self.assertEqual(DataCovid19Item.objects.count(), 5)
+        self.assertEqual(DataCovid19Item.objects.filter(confirmed_cases__isnull=True).count(), 1)
+
+    def test_save_data_copy_fallback(self):
+        # The tests run in SQLite, so COPY falls back to the bulk mode
+        date_saved = cron_covid19.save_data_copy(create_df())
+        self.assertEqual(str(date_saved), '2020-11-19')
+        self.assertEqual(DataCovid19Item.objects.count(), 3)
+
+    def test_save_file_replace(self):
+        df = create_df(last_update='2020-03-01 10:00:00')
+        df.loc[1, 'Country_Region'] = 'countryOther'
+        with mock.patch.object(cron_covid19, 'INGEST_MODE', 'BULK'):
+            cron_covid19.save_file('file1.csv', df, 'hash1')
+            # Other file with the same date and only some locations
+            df = create_df(rows=2, last_update='2020-03-01 11:00:00')
+            df['Deaths'] = 7
+            with mock.patch.object(cron_covid19, 'prepare_data', wraps=cron_covid19.prepare_data) as prepare_data:
+                cron_covid19.save_file('file2.csv', df, 'hash2')
+            # The data is prepared only once for deleting and saving
+            self.assertEqual(prepare_data.call_count, 1)
+
+        # Only the rows of the locations in the second file are replaced
+        self.assertEqual(DataCovid19Item.objects.count(), 3)
+        self.assertEqual(DataCovid19Item.objects.get(location__country__name='countryOther').dead_cases, 1)
+        self.assertEqual(DataCovid19Item.objects.filter(dead_cases=7).count(), 2)
+
+    def test_retention_job(self):
+        cron_covid19.save_data_bulk(create_df(last_update='2020-03-31 10:00:00'))
+        cron_covid19.save_data_bulk(create_df(last_update='2020-04-01 10:00:00'))
+        cron_covid19.rollups.refresh_rollups()
+
+        # Without RETENTION_MONTHS nothing is deleted
+        self.assertIsNone(cron_covid19.retention_job())
+        self.assertEqual(DataCovid19Item.objects.count(), 6)
+
+        with mock.patch.object(cron_covid19, 'RETENTION_MONTHS', '2'), \
+                mock.patch.object(cron_covid19, 'date', mock.Mock(today=lambda: date(2020, 5, 20))):
+            self.assertEqual(cron_covid19.retention_job(), 3)
+        # The months before April are deleted with their rollups
+        self.assertEqual(set(DataCovid19Item.objects.values_list('date', flat=True)), {date(2020, 4, 1)})
+        self.assertEqual(list(GlobalDaily.objects.values_list('date', flat=True)), [date(2020, 4, 1)])
+        self.assertFalse(CountryDaily.objects.filter(date__lt=date(2020, 4, 1)).exists())
+        self.assertFalse(DailyTrend.objects.filter(date__lt=date(2020, 4, 1)).exists())
+
+    def test_refresh_trends_null_gap(self):
+        days = [date(2020, 11, day) for day in range(1, 5)]
+        for day, confirmed in zip(days, [1000, None, 1010, 1020]):
+            CountryDaily.objects.create(country='countryTest', date=day, confirmed_cases=confirmed)
+        CountryDaily.objects.create(country='countryTest', date=date(2020, 12, 31), confirmed_cases=2000)
+        rollups.refresh_trends()
+
+        # Only the first date has all the cases as new cases, not the date after a NULL
+        self.assertEqual(list(DailyTrend.objects.filter(date__in=days).order_by('date')
+                              .values_list('new_confirmed_cases', flat=True)), [1000, None, None, 10])
+
+        # Only the trends until the longest window after the dates changed are rebuilt
+        last_trend = DailyTrend.objects.get(date=date(2020, 12, 31))
+        rollups.refresh_trends([date(2020, 11, 2)])
+        self.assertEqual(DailyTrend.objects.get(date=date(2020, 12, 31)).id, last_trend.id)
+        self.assertEqual(DailyTrend.objects.count(), 5)
+
+    def test_truncate_month_reload(self):
+        with tempfile.TemporaryDirectory() as folder:
+            list_urls = create_files(folder, 3)
+            cron_covid19.load_data_urls(list_urls)
+            self.assertEqual(IngestLedger.objects.get(url=list_urls[0]).first_date, date(2020, 11, 1))
+
+            self.assertIsNone(cron_covid19.truncate_month(date(2020, 11, 15)))
+            # The month is removed with its rollups and its files in the ledger
+            self.assertEqual(DataCovid19Item.objects.count(), 0)
+            self.assertEqual(IngestLedger.objects.count(), 0)
+            self.assertEqual(GlobalDaily.objects.count(), 0)
+            self.assertEqual(DailyTrend.objects.count(), 0)
+            self.assertEqual(LatestSnapshot.objects.count(), 0)
+
+            # The files are saved again by the next load
+            totals = cron_covid19.load_data_urls(list_urls)
+            self.assertEqual(totals['rows_saved'], 9)
+            self.assertEqual(DataCovid19Item.objects.count(), 9)
+            self.assertEqual(GlobalDaily.objects.count(), 3)
+
+    def test_fetch_data_urls(self):
+        with tempfile.TemporaryDirectory() as folder:
+            list_urls = create_files(folder)
+            list_urls.insert(2, pathlib.Path(folder, 'not_found.csv').as_uri())
+
+            result = list(cron_covid19.fetch_data_urls(list_urls, _workers=2))
+
+            # The dataframes are returned in the same order than the urls
+            self.assertEqual([url for url, df, content_hash in result], list_urls)
+            self.assertIsNone(result[2][1])
+            self.assertEqual(result[4][1]['Last_Update'][0], '2020-11-04 05:25:55')
+
+            cron_covid19.load_data_urls(list_urls)
+            self.assertEqual(DataCovid19Item.objects.count(), 15)
+
+            # The rollups are rebuilt with every file
+            self.assertEqual(GlobalDaily.objects.count(), 5)
+            self.assertEqual(CountryDaily.objects.get(date='2020-11-05').dead_cases, 3)
+            self.assertEqual(LatestSnapshot.objects.filter(date='2020-11-05', state__isnull=False).count(), 3)
+            snapshot = LatestSnapshot.objects.get(country='countryTest', state__isnull=True)
+            self.assertEqual(str(snapshot.date), '2020-11-05')
+            self.assertAlmostEqual(snapshot.mortality_tax, 15.0)
+            # Trends of the country and Global
+            self.assertEqual(DailyTrend.objects.count(), 10)
+            self.assertEqual(DailyTrend.objects.get(country='Global', date='2020-11-01').new_dead_cases, 3)
+            self.assertEqual(DailyTrend.objects.get(country='Global', date='2020-11-05').new_dead_cases, 0)
+
+    def test_fetch_timeout(self):
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.side_effect = TimeoutError('The read operation timed out')
+        # A timeout reading a file is handled like a file not found, with and without cache
+        for cache_dir in [self.cache_folder.name, '']:
+            with mock.patch.object(csv_cache, 'urlopen', return_value=response), \
+                    mock.patch.object(csv_cache, 'CSV_CACHE_DIR', cache_dir):
+                self.assertEqual(csv_cache.fetch('https://example.com/11-01-2020.csv', 1), (None, None))
+
+    def test_fetch_data_urls_bounded(self):
+        with tempfile.TemporaryDirectory() as folder:
+            list_urls = create_files(folder, 6)
+            with mock.patch.object(cron_covid19, 'read_url', wraps=cron_covid19.read_url) as read_url:
+                frames = cron_covid19.fetch_data_urls(list_urls, _workers=4, _frames=2)
+                next(frames)
+                # Only the returned file and the next ones until the limit are downloaded
+                self.assertLessEqual(read_url.call_count, 3)
+                self.assertEqual(len(list(frames)), 5)
+                self.assertEqual(read_url.call_count, 6)
+
+    def test_load_data_urls_not_changed(self):
+        with tempfile.TemporaryDirectory() as folder:
+            list_urls = create_files(folder, 3)
+            cron_covid19.load_data_urls(list_urls)
+            first_update = DataCovid19Item.objects.get(date='2020-11-01', location__state='').update_date
+
+            # Only the changed file is saved again
+            create_df(rows=4, last_update='2020-11-03 05:25:55').to_csv(os.path.join(folder, '3.csv'), index=False)
+            with mock.patch.object(csv_cache, 'CSV_CACHE_TTL', 0):
+                totals = cron_covid19.load_data_urls(list_urls)
+
+            self.assertEqual(totals['files'], 3)
+            self.assertEqual(totals['rows_saved'], 4)
+            self.assertEqual(str(totals['date_saved']), '2020-11-03')
+            # Cases of the last file
+            self.assertEqual(totals['dead_cases'], 4)
+            self.assertEqual(totals['confirmed_cases'], 30)
+            self.assertEqual(DataCovid19Item.objects.count(), 10)
+            self.assertEqual(DataCovid19Item.objects.get(date='2020-11-01', location__state='').update_date,
+                             first_update)
+            self.assertEqual(IngestLedger.objects.get(url=list_urls[2]).row_count, 4)
+            # The trends are calculated again from the changed date
+            trend = DailyTrend.objects.get(country='countryTest', date='2020-11-03')
+            self.assertEqual(trend.new_dead_cases, 1)
+            self.assertEqual(trend.avg7_dead_cases, 1.33)
+
+    @skipUnless(archive.pa, 'pyarrow is not installed')
+    def test_load_data_urls_archive(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cron_covid19.load_data_urls(create_files(folder, 3))
+
+        # Every date in its file, in the folder of the month
+        self.assertEqual(archive.get_archive_dates(), [date(2020, 11, day) for day in [1, 2, 3]])
+        self.assertTrue(os.path.exists(os.path.join(archive.ARCHIVE_DIR, 'month=2020-11', '2020-11-02.arrow')))
+        df = archive.read_archive(['country', 'state', 'latitude', 'dead_cases'], date(2020, 11, 2))
+        self.assertEqual(len(df), 6)
+        self.assertEqual(sorted(df['state'].unique()), ['', 'stateTest0', 'stateTest1'])
+        self.assertEqual(df['dead_cases'].sum(), 6)
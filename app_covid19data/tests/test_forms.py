@@ -3,21 +3,22 @@ from django.utils import timezone
 from model_bakery import baker
 
 from app_covid19data.models import DataCovid19Item
+from app_covid19data.tests.utils import get_location
 
 
 class Covid19dataTest(TestCase):
 
-    def create_DataCovid19Item(self, country='countryTest', state='stateTest', latitude=1, longitude=1):
-        return DataCovid19Item.objects.create(country=country, state=state, latitude=latitude,
-                                              longitude=longitude, date=timezone.now())
+    def create_DataCovid19Item(self, country='countryTest', state='stateTest', incidence_rate=1):
+        return DataCovid19Item.objects.create(location=get_location(country, state, 1, 1),
+                                              incidence_rate=incidence_rate, date=timezone.now())
 
     def test_covid19data_creation(self):
         # w = self.create_DataCovid19Item()
         w = baker.make(DataCovid19Item)
         self.assertTrue(isinstance(w, DataCovid19Item))
 
-        r = f'Daily data from {w.country}/{w.state} at {w.date}' \
-            f'Lat/Long: {w.latitude}/{w.longitude}' \
+        r = f'Daily data from {w.location.country.name}/{w.location.state} ' \
+            f'Lat/Long: {w.location.latitude}/{w.location.longitude} at {w.date}' \
             f'\nConfirmed: {w.confirmed_cases}' \
             f'\nDeaths: {w.dead_cases}' \
             f'\nRecovered: {w.recovered_cases}' \
@@ -27,10 +28,10 @@ class Covid19dataTest(TestCase):
         self.assertEqual(w.__str__(), r)
 
     def test_covid19data_exception(self):
-        self.assertRaises(Exception, self.create_DataCovid19Item, latitude='1')
+        self.assertRaises(Exception, self.create_DataCovid19Item, incidence_rate='1')
 
     def test_covid19data_save(self):
         # w = self.create_DataCovid19Item()
         w = baker.make(DataCovid19Item)
-        w.latitude = '1'
+        w.incidence_rate = '1'
         self.assertRaises(Exception, w.save)
\ No newline at end of file
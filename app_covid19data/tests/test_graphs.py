@@ -0,0 +1,107 @@
+import json
+import os
+import tempfile
+from datetime import date
+from unittest import mock, skipUnless
+
+from django.test import TestCase
+
+from app_covid19data import archive, graphs
+from app_covid19data.rollups import refresh_rollups
+from app_covid19data.tests.utils import make_item
+from cron import cron_graphs
+
+
+class Covid19GraphsTest(TestCase):
+
+    def test_save_heat_map(self):
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(cron_graphs, 'PATH_HEAT_MAP', f'{folder}/'):
+            first_name = cron_graphs.save_heat_map(b'<html>first</html>')
+            name = cron_graphs.save_heat_map(b'<html>second</html>')
+
+            self.assertRegex(name, r'^heat_map\.[0-9a-f]{12}\.html$')
+            with open(os.path.join(folder, cron_graphs.HEAT_MAP_POINTER)) as file:
+                self.assertEqual(json.load(file)['file'], name)
+            self.assertIn(f'{name}.gz', os.listdir(folder))
+            # The previous heat map is deleted
+            self.assertNotIn(first_name, os.listdir(folder))
+
+    def test_get_location_coordinates(self):
+        for day in [1, 2]:
+            make_item('Spain', 'Madrid', 40.4, -3.7, date=date(2020, 11, day), confirmed_cases=day * 10)
+            make_item('Spain', 'Toledo', 39.9, -4.0, date=date(2020, 11, day), confirmed_cases=day)
+            make_item('Spain', 'Unknown', float('nan'), None, date=date(2020, 11, day), confirmed_cases=day)
+
+        # Only the last date and the locations with coordinates
+        locations = cron_graphs.get_location_coordinates(_days=1, _grid=0)
+        self.assertEqual(sorted(row['weight'] for row in locations), [2, 20])
+
+        # The near locations are joined in the grid
+        locations = cron_graphs.get_location_coordinates(_days=2, _grid=1)
+        self.assertEqual(locations, [{'latitude': 40, 'longitude': -4, 'weight': 22}])
+
+    @skipUnless(archive.pa, 'pyarrow is not installed')
+    def test_get_location_coordinates_archive(self):
+        for day in [1, 2]:
+            make_item('Spain', 'Madrid', 40.4, -3.7, date=date(2020, 11, day), confirmed_cases=day * 10)
+            make_item('Spain', 'Unknown', float('nan'), None, date=date(2020, 11, day), confirmed_cases=day)
+
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(archive, 'ARCHIVE_DIR', folder):
+            archive.write_dates([date(2020, 11, 2)])
+            with mock.patch.object(archive, 'read_archive', wraps=archive.read_archive) as read_archive:
+                # The data is read from the archive, with the same locations than the DB
+                locations = cron_graphs.get_location_coordinates(_days=1, _grid=0)
+                self.assertEqual(locations, [{'latitude': 40.4, 'longitude': -3.7, 'weight': 20}])
+                self.assertEqual(read_archive.call_count, 1)
+
+                # Without all the dates in the archive the data is read from the DB
+                locations = cron_graphs.get_location_coordinates(_days=2, _grid=0)
+                self.assertEqual(locations, [{'latitude': 40.4, 'longitude': -3.7, 'weight': 20}])
+                self.assertEqual(read_archive.call_count, 1)
+
+    def test_generate_heat_map(self):
+        with tempfile.TemporaryDirectory() as folder, \
+                mock.patch.object(cron_graphs, 'PATH_HEAT_MAP', f'{folder}/'):
+            cron_graphs.generate_heat_map([{'latitude': 40.4, 'longitude': -3.7, 'weight': 100},
+                                           {'latitude': 39.9, 'longitude': -4.0, 'weight': 1}])
+            with open(os.path.join(folder, cron_graphs.HEAT_MAP_POINTER)) as file:
+                name = json.load(file)['file']
+            with open(os.path.join(folder, name)) as file:
+                self.assertIn('[40.4, -3.7, 1.0]', file.read())
+
+    def test_get_accumulate_amounts(self):
+        for day in [2, 1]:
+            for state in ['Madrid', 'Toledo']:
+                make_item('Spain', state, date=date(2020, 11, day), dead_cases=day)
+        refresh_rollups()
+
+        df_amounts = cron_graphs.get_accumulate_amounts()
+        self.assertEqual(df_amounts['dead_cases'].tolist(), [2, 4])
+        self.assertEqual(df_amounts['date'].tolist(), [date(2020, 11, 1), date(2020, 11, 2)])
+
+    def test_get_graph_jobs(self):
+        make_item('Spain', date=date(2020, 11, 1), dead_cases=1)
+        make_item('United Kingdom', date=date(2020, 11, 1), dead_cases=2)
+        refresh_rollups()
+
+        jobs = cron_graphs.get_graph_jobs(cron_graphs.get_accumulate_amounts())
+        paths = {path: values.tolist() for path, values, label, color in jobs}
+        self.assertEqual(paths[f'{cron_graphs.PATH_GRAPH}graph_red.png'], [3])
+        # The graphs of the countries are rendered on demand
+        self.assertEqual(len(jobs), 3)
+
+    def test_render_graph(self):
+        image = graphs.render_graph([1, 2, 4], 'Dead cases', 'red')
+        self.assertTrue(image.startswith(b'\x89PNG'))
+
+    def test_render_graphs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            jobs = [(os.path.join(folder, f'graph_{color}.png'), [1, 2, day], label, color)
+                    for day, (field, label, color) in enumerate(graphs.GRAPH_TYPES.values())]
+            self.assertEqual(len(graphs.render_graphs(jobs, _workers=2)), 3)
+
+            # Only the graph whose series has changed is rendered again
+            jobs[0] = (jobs[0][0], [1, 2, 3], jobs[0][2], jobs[0][3])
+            self.assertEqual(graphs.render_graphs(jobs, _workers=1), [jobs[0][0]])
+            self.assertEqual(graphs.render_graphs(jobs, _workers=1), [])
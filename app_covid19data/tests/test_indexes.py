@@ -0,0 +1,66 @@
+import re
+from datetime import date, timedelta
+
+from django.db import connection
+from django.db.models import Max, Q, F
+from django.test import TestCase
+
+from app_covid19data.models import DataCovid19Item, LatestSnapshot, Country, Location
+from app_covid19data.rollups import refresh_rollups, sum_cases
+
+
+class Covid19IndexesTest(TestCase):
+    """ Query plans of the hot queries, they have to use an index with a dataset of realistic size """
+
+    @classmethod
+    def setUpTestData(cls):
+        # 200 countries with 5 states for 30 days
+        first_day = date(2020, 11, 1)
+        Country.objects.bulk_create([Country(name=f'Country {country}', key=f'country {country}')
+                                     for country in range(200)])
+        Location.objects.bulk_create([Location(country=country, state=f'State {state}')
+                                      for country in Country.objects.all() for state in range(5)])
+        DataCovid19Item.objects.bulk_create(
+            [DataCovid19Item(location=location, date=first_day + timedelta(day),
+                             confirmed_cases=location.country_id * day, dead_cases=day, recovered_cases=location.id,
+                             active_cases=0)
+             for location in Location.objects.all() for day in range(30)], batch_size=1000)
+        refresh_rollups()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.max_date = first_day + timedelta(29)
+
+    def assertIndexScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            self.assertRegex(plan, r'Index (Only )?Scan', plan)
+        else:
+            self.assertRegex(plan, r'USING (COVERING )?INDEX', plan)
+            self.assertIsNone(re.search(r'SCAN (TABLE )?app_covid19data_\w+$', plan, re.MULTILINE), plan)
+
+    def test_index_country_date(self):
+        self.assertIndexScan(DataCovid19Item.objects.filter(location__country__name='Country 1').order_by('-date'))
+
+    def test_index_date(self):
+        # Query of the rollups refresh
+        self.assertIndexScan(DataCovid19Item.objects.filter(date__in=[self.max_date])
+                             .values('date', country=F('location__country__name')).annotate(**sum_cases())
+                             .order_by())
+
+    def test_index_max_date(self):
+        self.assertIndexScan(DataCovid19Item.objects.filter(location__country__name='Country 1')
+                             .values('location__country').annotate(max_date=Max('date')))
+
+    def test_index_retention(self):
+        self.assertIndexScan(DataCovid19Item.objects.filter(date__lt=date(2020, 11, 1)))
+
+    def test_index_rank(self):
+        for field in ['dead_cases', 'confirmed_cases', 'mortality_tax', 'recovered_tax']:
+            # Next page of the keyset pagination
+            self.assertIndexScan(LatestSnapshot.objects.filter(Q(**{f'{field}__lt': 10}) |
+                                                               Q(**{field: 10, 'country__gt': 'Country 1'}),
+                                                               state__isnull=True, **{f'{field}__isnull': False})
+                                 .order_by(f'-{field}', 'country')[:51])
+
+    def test_index_snapshot(self):
+        self.assertIndexScan(LatestSnapshot.objects.filter(country='Country 1', state__isnull=False))
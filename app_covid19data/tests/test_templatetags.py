@@ -0,0 +1,15 @@
+from django.test import SimpleTestCase
+
+from app_covid19data.templatetags.covid19_filters import thousands, decimals
+
+
+class Covid19FiltersTest(SimpleTestCase):
+
+    def test_thousands(self):
+        self.assertEqual(thousands(1234567), '1,234,567')
+        self.assertEqual(thousands(None), '')
+
+    def test_decimals(self):
+        self.assertEqual(decimals(1234.567), '1,234.57')
+        self.assertEqual(decimals(2), '2.00')
+        self.assertEqual(decimals(None), '')
@@ -1,10 +1,19 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import date
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
-from model_bakery import baker
 
-from app_covid19data.models import DataCovid19Item
-from app_covid19data import views
+from app_covid19data.models import Country
+from app_covid19data import graph_cache, heat_maps, views
+from app_covid19data.rollups import refresh_rollups
+from app_covid19data.tests.utils import make_item
 
 
 class Covid19dataTest(TestCase):
@@ -12,9 +21,13 @@ class Covid19dataTest(TestCase):
     def setUp(self):
         """ Method which the testing framework will automatically call before every single test we run """
         # Create several rows
-        self.datacovid19 = baker.make(DataCovid19Item, country='Spain', date=timezone.now().date(),
-                                      dead_cases=1, confirmed_cases=1, recovered_cases=1,
-                                      _quantity=5)
+        self.datacovid19 = [make_item('Spain', f'state{state}', date=timezone.now().date(),
+                                      dead_cases=1, confirmed_cases=1, recovered_cases=1)
+                            for state in range(5)]
+        # The views read the rollups rebuilt by the ingest
+        refresh_rollups()
+        # The cache is not rolled back with the DB after every test
+        cache.clear()
 
     # Views tests
     def test_covid19data_resume_view(self):
@@ -28,7 +41,210 @@ class Covid19dataTest(TestCase):
         queryset = views.get_resume_country('Spain')
         self.assertEqual(queryset['country'], 'Spain')
 
+    def test_covid19data_get_resume_global(self):
+        queryset = views.get_resume_country('Global')
+        self.assertEqual(queryset['dead_cases'], 5)
+        self.assertEqual(queryset['mortality_tax'], 100)
+
+    def test_covid19data_get_global_rank(self):
+        queryset, max_date, next_cursor = views.get_global_rank()
+        self.assertEqual(max_date, timezone.now().date())
+        self.assertEqual(queryset[0]['confirmed_cases'], 5)
+        self.assertIsNone(next_cursor)
+
+    def test_covid19data_get_global_rank_pages(self):
+        for country, dead_cases in [('Italy', 5), ('France', 2), ('Germany', 2), ('Chile', 0)]:
+            make_item(country, date=timezone.now().date(), dead_cases=dead_cases, confirmed_cases=10,
+                      recovered_cases=1)
+        refresh_rollups()
+
+        # The countries with the same value are ordered by name
+        for sort, expected in [('dead', ['Italy', 'Spain', 'France', 'Germany', 'Chile']),
+                               ('mortality', ['Spain', 'Italy', 'France', 'Germany', 'Chile']),
+                               ('recovered', ['Spain', 'Chile', 'France', 'Germany', 'Italy'])]:
+            countries, cursor = [], None
+            for page in range(3):
+                rows, max_date, cursor = views.get_global_rank(sort, cursor, 2)
+                countries.extend(row['country'] for row in rows)
+            self.assertEqual(countries, expected)
+            self.assertIsNone(cursor)
+
+    def test_covid19data_rank_view(self):
+        make_item('Italy', date=timezone.now().date(), dead_cases=10, confirmed_cases=10)
+        refresh_rollups()
+
+        resp = self.client.get(reverse(views.rank_view), {'sort': 'confirmed', 'limit': 1})
+        self.assertEqual(resp.status_code, 200)
+        rank = resp.json()
+        self.assertEqual(rank['country'], ['Italy'])
+        self.assertEqual(rank['mortality_tax'], [100])
+
+        rank = self.client.get(reverse(views.rank_view), {'sort': 'confirmed', 'limit': 1,
+                                                          'cursor': rank['next']}).json()
+        self.assertEqual(rank['country'], ['Spain'])
+        self.assertIsNone(rank['next'])
+
+        self.assertEqual(self.client.get(reverse(views.rank_view), {'sort': 'active'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse(views.rank_view), {'cursor': 'other'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse(views.global_view), {'limit': 0}).status_code, 400)
+
     def test_covid19data_get_detail_country(self):
         queryset = views.get_detail_country('Spain')
         print(queryset) 
         self.assertGreaterEqual(len(queryset), 1)
+
+    def test_covid19data_detail_view(self):
+        # The country is searched without case
+        resp = self.client.get(reverse(views.detail_view, args=['SPAIN']))
+        self.assertContains(resp, 'Spain Areas')
+        self.assertEqual(self.client.get(reverse(views.detail_view, args=['France'])).status_code, 404)
+
+    def test_covid19data_latest_snapshot(self):
+        # A country whose last data is older than the rest is in the rank with its latest data
+        make_item('Italy', 'Roma', date=date(2020, 11, 1), dead_cases=9, confirmed_cases=10)
+        refresh_rollups()
+
+        # Only one query without the max date
+        with self.assertNumQueries(1):
+            rows, max_date, next_cursor = views.get_global_rank()
+        self.assertEqual([row['country'] for row in rows], ['Italy', 'Spain'])
+        self.assertEqual(max_date, timezone.now().date())
+        with self.assertNumQueries(1):
+            rows, max_date = views.get_detail_country('Italy')
+        self.assertEqual([row['state'] for row in rows], ['Roma'])
+        self.assertEqual(max_date, date(2020, 11, 1))
+        self.assertEqual(rows[0]['mortality_tax'], 90)
+
+    def test_covid19data_countries(self):
+        make_item('Italy', date=timezone.now().date())
+        refresh_rollups([timezone.now().date()])
+
+        self.assertEqual(list(Country.objects.order_by('name').values_list('name', flat=True)), ['Italy', 'Spain'])
+        resp = self.client.get(reverse(views.resume_view))
+        self.assertContains(resp, '<option value="Italy">Italy</option>')
+
+    def test_covid19data_rates_without_confirmed_cases(self):
+        make_item('Italy', 'Roma', date=timezone.now().date(), dead_cases=1, confirmed_cases=0, recovered_cases=0)
+        refresh_rollups()
+
+        queryset, max_date = views.get_detail_country('Italy')
+        self.assertIsNone(queryset[0]['mortality_tax'])
+
+        resp = self.client.get(reverse(views.global_view))
+        self.assertContains(resp, '<td> 100.00 % </td>')
+
+    def test_covid19data_heatmap_view(self):
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(heat_maps, 'HEAT_MAP_DIR', folder):
+            resp = self.client.get(reverse(views.heatmap_view))
+            self.assertContains(resp, 'The heat map is not generated yet')
+
+            name = 'heat_map.0123456789ab.html'
+            with open(os.path.join(folder, name), 'wb') as file:
+                file.write(b'<html>map</html>')
+            with open(os.path.join(folder, heat_maps.HEAT_MAP_POINTER), 'w') as file:
+                json.dump({'file': name}, file)
+            resp = self.client.get(reverse(views.heatmap_view))
+            self.assertEqual(resp.status_code, 200)
+            self.assertContains(resp, f'src="{views.get_heat_map_url()}"')
+            self.assertEqual(views.get_heat_map_url(), reverse(views.heat_map_file_view, args=[name]))
+
+    def test_covid19data_heat_map_file_view(self):
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(heat_maps, 'HEAT_MAP_DIR', folder):
+            self.assertEqual(self.client.get(reverse(views.heat_map_file_view, args=['map'])).status_code, 404)
+
+            # A new heat map is served without restarting the server, compressed if the client accepts it
+            name = 'heat_map.0123456789ab.html'
+            with open(os.path.join(folder, name), 'wb') as file:
+                file.write(b'<html>map</html>')
+            with open(os.path.join(folder, f'{name}.gz'), 'wb') as file:
+                file.write(gzip.compress(b'<html>map</html>'))
+            with open(os.path.join(folder, heat_maps.HEAT_MAP_POINTER), 'w') as file:
+                json.dump({'file': name}, file)
+            url = reverse(views.heat_map_file_view, args=[name])
+            resp = self.client.get(url)
+            self.assertEqual(b''.join(resp.streaming_content), b'<html>map</html>')
+            self.assertIn('immutable', resp['Cache-Control'])
+            self.assertEqual(resp['X-Frame-Options'], 'SAMEORIGIN')
+
+            resp = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(resp['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(b''.join(resp.streaming_content)), b'<html>map</html>')
+            resp = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=resp['ETag'])
+            self.assertEqual(resp.status_code, 304)
+
+            # An old heat map redirects to the current one
+            resp = self.client.get(reverse(views.heat_map_file_view, args=['heat_map.ba9876543210.html']))
+            self.assertRedirects(resp, url, fetch_redirect_response=False)
+
+    def test_covid19data_graph_image_view(self):
+        graph_cache.get_graph_image.cache_clear()
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(graph_cache, 'GRAPH_CACHE_DIR', folder):
+            url = reverse(views.graph_image_view, args=['death', 'Spain'])
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp['Content-Type'], 'image/png')
+            self.assertEqual(len(os.listdir(folder)), 1)
+
+            # The image has not changed while the data generation is the same
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+            self.assertEqual(resp.status_code, 304)
+
+            resp = self.client.get(url, {'format': 'svg'})
+            self.assertEqual(resp['Content-Type'], 'image/svg+xml')
+
+            self.assertEqual(self.client.get(reverse(views.graph_image_view, args=['death', 'France'])).status_code,
+                             404)
+            # The country is searched by its key, like in the detail view
+            self.assertEqual(self.client.get(reverse(views.graph_image_view, args=['death', 'SPAIN'])).status_code,
+                             200)
+            self.assertEqual(self.client.get(reverse(views.graph_image_view, args=['other', 'Spain'])).status_code,
+                             404)
+
+    def test_covid19data_country_graph_view(self):
+        resp = self.client.get(reverse('Country Graph', args=['death', 'Spain']))
+        self.assertContains(resp, reverse(views.graph_image_view, args=['death', 'Spain']))
+        self.assertContains(resp, reverse(views.series_view, args=['Spain']))
+
+        resp = self.client.get(reverse('Graph', args=['recovered']))
+        self.assertContains(resp, 'covid19web/img/graph_blue.')
+        self.assertContains(resp, reverse(views.series_view, args=['Global']))
+
+    def test_covid19data_get_series(self):
+        for day in [1, 2, 4]:
+            make_item('Italy', date=date(2020, 11, day), dead_cases=day * 10)
+        refresh_rollups()
+
+        series = views.get_series('Italy', ['dead_cases'])
+        self.assertEqual(series['date'], ['2020-11-01', '2020-11-02', '2020-11-04'])
+        self.assertEqual(series['dead_cases'], [10, 20, 40])
+
+        # The new cases of the first date are calculated with the previous date
+        series = views.get_series('Italy', ['dead_cases'], _date_from=date(2020, 11, 2), _delta=True)
+        self.assertEqual(series['dead_cases'], [10, 20])
+        self.assertEqual(views.get_series('Italy', ['dead_cases'], _delta=True)['dead_cases'], [10, 10, 20])
+        # The means are in days of calendar, there is no data of 2020-11-03
+        self.assertEqual(views.get_series('Italy', ['dead_cases'], _mean=7)['dead_cases'], [10, 10, 13.33])
+        self.assertEqual(views.get_series('Global', ['dead_cases'], _delta=True)['dead_cases'][:3], [10, 10, 20])
+
+    def test_covid19data_series_view(self):
+        # The responses are compressed from 200 bytes
+        for day in range(1, 31):
+            make_item('Italy', date=date(2020, 11, day), dead_cases=day)
+        refresh_rollups()
+
+        url = reverse(views.series_view, args=['Global'])
+        resp = self.client.get(url, {'fields': 'dead_cases'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(resp.content))['dead_cases'], [*range(1, 31), 5])
+
+        resp = self.client.get(url, {'fields': 'dead_cases'}, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        self.assertEqual(self.client.get(url, {'from': '2020-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'fields': 'latitude'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'mean': '5'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse(views.series_view, args=['France'])).status_code, 404)
+        resp = self.client.get(reverse(views.series_view, args=['ITALY']), {'fields': 'dead_cases'})
+        self.assertEqual(resp.json()['country'], 'Italy')
+        self.assertEqual(resp.json()['dead_cases'], [*range(1, 31)])
@@ -0,0 +1,15 @@
+from model_bakery import baker
+
+from app_covid19data.models import DataCovid19Item, Country, Location
+
+
+def get_location(country='countryTest', state='', latitude=None, longitude=None):
+    """ Return the location of a country and state, created with its country if it does not exist """
+    country_item = Country.objects.get_or_create(key=country.lower(), defaults={'name': country})[0]
+    return Location.objects.get_or_create(country=country_item, state=state,
+                                          defaults={'latitude': latitude, 'longitude': longitude})[0]
+
+
+def make_item(country='countryTest', state='', latitude=None, longitude=None, **kwargs):
+    """ Create a row of data of a country and state with baker """
+    return baker.make(DataCovid19Item, location=get_location(country, state, latitude, longitude), **kwargs)
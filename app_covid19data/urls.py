@@ -9,5 +9,10 @@ urlpatterns = [
     path('global/', views.global_view, name='Global Rank'),
     path('detail/<str:country>/', views.detail_view, name='Resume Spain Areas'),
     path('heatmap/', views.heatmap_view, name='Heat Map'),
+    path('heatmap/<str:name>/', views.heat_map_file_view, name='Heat Map File'),
     path('graph/<str:graph_type>/', views.graph_view, name='Graph'),
+    path('graph/<str:graph_type>/<str:country>/', views.graph_view, name='Country Graph'),
+    path('graph/<str:graph_type>/<str:country>/image/', views.graph_image_view, name='Graph Image'),
+    path('api/series/<str:country>/', views.series_view, name='Series'),
+    path('api/rank/', views.rank_view, name='Rank'),
 ]
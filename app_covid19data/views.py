@@ -1,10 +1,31 @@
 # by Richi Rod AKA @richionline / falken20
 
 import os
+import base64
+import hashlib
+import json
 import logging
-from django.shortcuts import render
-from django.db.models import Sum, Max
-from .models import DataCovid19Item
+from datetime import date
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.utils.text import slugify
+from django.views.decorators.cache import cache_control
+from django.views.decorators.clickjacking import xframe_options_sameorigin
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import etag
+from django.db.models import Q
+from .models import Country, GlobalDaily, CountryDaily, LatestSnapshot, DailyTrend
+from .rollups import CASES_FIELDS, GLOBAL, TREND_WINDOWS, get_country_name, rate_cases
+from .caching import cache_view, get_cached_data, get_data_generation
+from . import graphs, heat_maps
+from .graph_cache import get_graph_image, IMAGE_FORMATS
+
+# Sorts of the global rank with their field, always descending, and countries in every page
+RANK_SORTS = {'dead': 'dead_cases', 'confirmed': 'confirmed_cases', 'mortality': 'mortality_tax',
+              'recovered': 'recovered_tax'}
+RANK_PAGE_SIZE = int(os.getenv('RANK_PAGE_SIZE', 50))
+RANK_MAX_PAGE_SIZE = 500
 
 
 def get_resume_country(_country_name):
@@ -15,35 +36,15 @@ def get_resume_country(_country_name):
     """
     try:
         logging.info(f'{os.getenv("ID_LOG", "")} Getting resume for {_country_name}')
+        # The amounts are read from the rollups rebuilt by the ingest, the taxes are calculated in the DB and
+        # the amounts are formatted in the template. The latest data of a country is in the latest snapshot
         if _country_name.upper() == 'GLOBAL':
-            queryset = \
-                DataCovid19Item.objects.values('date').annotate(dead_cases=Sum('dead_cases'),
-                                                                confirmed_cases=Sum('confirmed_cases'),
-                                                                recovered_cases=Sum('recovered_cases'),
-                                                                active_cases=Sum('active_cases'),
-                                                                ).order_by('-date')[0]
+            queryset = GlobalDaily.objects.values('date', *CASES_FIELDS).annotate(
+                **rate_cases()).order_by('-date')[0]
         else:
-            queryset = \
-                DataCovid19Item.objects.values('country',
-                                               'date').annotate(dead_cases=Sum('dead_cases'),
-                                                                confirmed_cases=Sum('confirmed_cases'),
-                                                                recovered_cases=Sum('recovered_cases'),
-                                                                active_cases=Sum('active_cases'),
-                                                                ).filter(country=_country_name).order_by('-date')[0]
-
-        # Calculate mortality and recovered tax
-        queryset['mortality_tax'] = round(queryset['dead_cases'] / queryset['confirmed_cases'] * 100, 2)
-        queryset['recovered_tax'] = round(queryset['recovered_cases'] / queryset['confirmed_cases'] * 100, 2)
-
-        # Format the thousands and decimal separators
-        # :,d means format thousands separators in a integer
-        # :,.2f means format thousands and deciman separators in a float
-        queryset['dead_cases'] = f'{queryset["dead_cases"]:,d}'
-        queryset['confirmed_cases'] = f'{queryset["confirmed_cases"]:,d}'
-        queryset['recovered_cases'] = f'{queryset["recovered_cases"]:,d}'
-        queryset['active_cases'] = f'{queryset["active_cases"]:,d}'
-        queryset['mortality_tax'] = f'{queryset["mortality_tax"]:,.2f}'
-        queryset['recovered_tax'] = f'{queryset["recovered_tax"]:,.2f}'
+            queryset = LatestSnapshot.objects.values('country', 'date', *CASES_FIELDS, 'mortality_tax',
+                                                     'recovered_tax').filter(country=_country_name,
+                                                                             state__isnull=True)[0]
 
         logging.info(f'{os.getenv("ID_LOG", "")} Resume for {_country_name} successfully')
 
@@ -65,19 +66,24 @@ def resume_view(request):
         country_name = 'Spain'
     logging.info(f'{os.getenv("ID_LOG", "")} Showing the resume table for {country_name}')
 
-    # Get the countries names for the combo to shoose country
-    countries = DataCovid19Item.objects.values('country').order_by('country').distinct()
+    def get_data():
+        # Get the countries names for the combo to shoose country, from the dimension kept by the ingest
+        countries = list(Country.objects.values('name').order_by('name'))
 
-    # Get the last record in DB grouping by country_name and date, the view shows data from Spain by default
-    # This is because the amount of the vars is accumulated every day
-    queryset = get_resume_country(country_name)
+        # Get the last record in DB grouping by country_name and date, the view shows data from Spain by default
+        # This is because the amount of the vars is accumulated every day
+        queryset = get_resume_country(country_name)
 
-    queryset_global = get_resume_country('Global')
+        queryset_global = get_resume_country('Global')
+
+        return {'resume_country': queryset, 'resume_global': queryset_global, 'countries': countries}
+
+    # Only the data is cached and not the response, because the page has a form with the CSRF token
+    context = get_cached_data(f'resume_view:{request.method}:{country_name}', get_data)
 
     template_name = 'covid19data/resume.html'
 
-    return render(request, template_name, {'resume_country': queryset, 'resume_global': queryset_global,
-                                           'countries': countries})
+    return render(request, template_name, context)
 
 
 def get_detail_country(_country_name):
@@ -89,41 +95,15 @@ def get_detail_country(_country_name):
     try:
         logging.info(f'{os.getenv("ID_LOG", "")} Getting detail for {_country_name}')
 
-        # Get the last data date
-        query_max_date = DataCovid19Item.objects.filter(country=_country_name).aggregate(max_date=Max('date'))
-        logging.info(f'{os.getenv("ID_LOG", "")} Max date for {_country_name} in DB: {query_max_date["max_date"]}')
-
-        queryset = \
-            DataCovid19Item.objects.values('country',
-                                           'state',
-                                           'date').annotate(dead_cases=Sum('dead_cases'),
-                                                            confirmed_cases=Sum('confirmed_cases'),
-                                                            recovered_cases=Sum('recovered_cases'),
-                                                            active_cases=Sum('active_cases'),
-                                                            ).filter(country=_country_name,
-                                                                     date=query_max_date["max_date"],
-                                                                     ).exclude(state='Unknown')
-
-        for row in queryset:
-            # Calculate mortality and recovered tax
-            if row['dead_cases'] != 0:
-                row['mortality_tax'] = round(row['dead_cases'] / row['confirmed_cases'] * 100, 2)
-                row['mortality_tax'] = f'{row["mortality_tax"]:,.2f}'
-            if row['recovered_cases'] != 0:
-                row['recovered_tax'] = round(row['recovered_cases'] / row['confirmed_cases'] * 100, 2)
-                row['recovered_tax'] = f'{row["recovered_tax"]:,.2f}'
-
-            # Format the thousands and decimal separators
-            # :,d means format thousands separators in a integer
-            # :,.2f means format thousands and deciman separators in a float
-            row['dead_cases'] = f'{row["dead_cases"]:,d}'
-            row['confirmed_cases'] = f'{row["confirmed_cases"]:,d}'
-            row['recovered_cases'] = f'{row["recovered_cases"]:,d}'
-            row['active_cases'] = f'{row["active_cases"]:,d}'
-
-        logging.info(f'{os.getenv("ID_LOG", "")} Get detail for {_country_name} successfully: {len(queryset)} rows')
-
-        return queryset, query_max_date['max_date']
+        # The latest snapshot only has the data of the last date of every country, with the taxes, so the
+        # date of the data is the date of any row
+        rows = list(LatestSnapshot.objects.values('country', 'state', 'date', *CASES_FIELDS, 'mortality_tax',
+                                                  'recovered_tax')
+                    .filter(country=_country_name, state__isnull=False).exclude(state='Unknown'))
+        max_date = rows[0]['date'] if rows else None
+        logging.info(f'{os.getenv("ID_LOG", "")} Get detail for {_country_name} at {max_date} successfully')
+
+        return rows, max_date
 
     except Exception as err:
         logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
@@ -132,10 +112,15 @@ def get_detail_country(_country_name):
                       f'Arguments:\n {err.args}')
 
 
+@cache_view
 def detail_view(request, country='Spain'):
     """ Showing a detail data table of a country that it indicates in the param country """
 
-    country = country.title()
+    # The canonical name of the country is searched by its key in lowercase
+    country_name = Country.objects.filter(key=country.lower()).values_list('name', flat=True).first()
+    if country_name is None:
+        raise Http404(f'Country {country} not found')
+    country = country_name
     logging.info(f'{os.getenv("ID_LOG", "")} Showing the resume table for {country}')
 
     queryset, max_date = get_detail_country(country)
@@ -144,79 +129,303 @@ def detail_view(request, country='Spain'):
     return render(request, template_name, {'detail_country': queryset, 'country': country, 'max_date': max_date})
 
 
-def get_global_rank():
-    """ Get the country list order by mortality tax"""
+def encode_cursor(_value, _country):
+    """ Return the cursor of the next page of the rank, after the value of the sort and the country """
+    return base64.urlsafe_b64encode(json.dumps([_value, _country]).encode()).decode()
+
+
+def decode_cursor(_cursor):
+    """ Return the value of the sort and the country of a cursor, ValueError if it is not valid """
+    try:
+        value, country = json.loads(base64.urlsafe_b64decode(_cursor.encode()))
+    except Exception as err:
+        raise ValueError(f'Cursor {_cursor} not valid') from err
+    if not isinstance(value, (int, float)) or not isinstance(country, str):
+        raise ValueError(f'Cursor {_cursor} not valid')
+    return value, country
+
+
+def get_global_rank(_sort='dead', _cursor=None, _limit=RANK_PAGE_SIZE):
+    """
+    Get a page of the country list with their latest data ordered by a field, with keyset pagination: the next
+    page starts after the value of the sort and the country of the last row, so every page is read from the
+    index of the sort in the same time. The countries without value for the sort are not in the rank.
+    :param _sort: Sort of the rank: dead, confirmed, mortality or recovered
+    :param _cursor: Cursor returned with the previous page, None for the first page
+    :param _limit: Number of countries in the page
+    :return: Return the rows of the page, the max date of the rows and the cursor of the next page (None in
+    the last page)
+    """
     try:
-        logging.info(f'{os.getenv("ID_LOG", "")} Getting the country list order by mortality tax')
-
-        # Get the last data date
-        query_max_date = DataCovid19Item.objects.aggregate(max_date=Max('date'))
-        logging.info(f'{os.getenv("ID_LOG", "")} Max date in DB: {query_max_date["max_date"]}')
-
-        queryset = \
-            DataCovid19Item.objects.values('country',
-                                           'date').annotate(dead_cases=Sum('dead_cases'),
-                                                            confirmed_cases=Sum('confirmed_cases'),
-                                                            recovered_cases=Sum('recovered_cases'),
-                                                            active_cases=Sum('active_cases'),
-                                                            ).filter(date=query_max_date["max_date"],
-                                                                     ).order_by('-dead_cases')
-
-        for row in queryset:
-            # Calculate mortality and recovered tax
-            if row['dead_cases'] != 0:
-                row['mortality_tax'] = round(row['dead_cases'] / row['confirmed_cases'] * 100, 2)
-                row['mortality_tax'] = f'{row["mortality_tax"]:,.2f}'
-            if row['recovered_cases'] != 0:
-                row['recovered_tax'] = round(row['recovered_cases'] / row['confirmed_cases'] * 100, 2)
-                row['recovered_tax'] = f'{row["recovered_tax"]:,.2f}'
-
-            # Format the thousands and decimal separators
-            # :,d means format thousands separators in a integer
-            # :,.2f means format thousands and deciman separators in a float
-            row['dead_cases'] = f'{row["dead_cases"]:,d}'
-            row['confirmed_cases'] = f'{row["confirmed_cases"]:,d}'
-            row['recovered_cases'] = f'{row["recovered_cases"]:,d}'
-            row['active_cases'] = f'{row["active_cases"]:,d}'
+        logging.info(f'{os.getenv("ID_LOG", "")} Getting the country list order by {_sort}')
+
+        # The latest data of every country and its taxes are saved in the latest snapshot by the ingest
+        field = RANK_SORTS[_sort]
+        queryset = LatestSnapshot.objects.values('country', 'date', *CASES_FIELDS, 'mortality_tax',
+                                                 'recovered_tax')\
+            .filter(state__isnull=True, **{f'{field}__isnull': False})
+        if _cursor:
+            value, country = decode_cursor(_cursor)
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'country__gt': country}))
+        rows = list(queryset.order_by(f'-{field}', 'country')[:_limit + 1])
+
+        next_cursor = encode_cursor(rows[_limit - 1][field], rows[_limit - 1]['country']) \
+            if len(rows) > _limit else None
+        rows = rows[:_limit]
+        max_date = max((row['date'] for row in rows), default=None)
 
         logging.info(f'{os.getenv("ID_LOG", "")} Getting global rank successfully')
 
-        return queryset, query_max_date["max_date"]
+        return rows, max_date, next_cursor
 
     except Exception as err:
         logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
+
 
+def get_rank_params(request):
+    """ Return the sort, the cursor and the limit of the rank in the request, ValueError if they are not valid """
+    sort = request.GET.get('sort', 'dead')
+    if sort not in RANK_SORTS:
+        raise ValueError(f'The sort must be in {",".join(RANK_SORTS)}')
+    cursor = request.GET.get('cursor')
+    if cursor:
+        decode_cursor(cursor)
+    limit = int(request.GET.get('limit', RANK_PAGE_SIZE))
+    if not 0 < limit <= RANK_MAX_PAGE_SIZE:
+        raise ValueError(f'The limit must be from 1 to {RANK_MAX_PAGE_SIZE}')
+    return sort, cursor, limit
 
+
+@cache_view
 def global_view(request):
-    """ Showing global country rank """
+    """ Showing global country rank, with the params sort, cursor and limit """
     logging.info(f'{os.getenv("ID_LOG", "")} Showing the global country rank')
 
-    queryset, max_date = get_global_rank()
+    try:
+        sort, cursor, limit = get_rank_params(request)
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+
+    queryset, max_date, next_cursor = get_global_rank(sort, cursor, limit)
     template_name = 'covid19data/global.html'
 
-    return render(request, template_name, {'global_rank': queryset, 'max_date': max_date})
+    return render(request, template_name, {'global_rank': queryset, 'max_date': max_date, 'sort': sort,
+                                           'limit': limit, 'next_cursor': next_cursor})
+
+
+def get_rank_etag(request):
+    """ Return the ETag of a page of the rank, it only changes with the data generation and the params """
+    return f'{get_data_generation()}-{hashlib.md5(request.GET.urlencode().encode()).hexdigest()}'
+
+
+@gzip_page
+@cache_control(public=True, no_cache=True)
+@etag(get_rank_etag)
+def rank_view(request):
+    """
+    Return in JSON a page of the global country rank, with a list of values for every field
+    :param request: Request, with the params sort (dead, confirmed, mortality or recovered), cursor (next of
+    the previous page) and limit
+    """
+    logging.info(f'{os.getenv("ID_LOG", "")} Showing the global country rank in JSON')
+
+    try:
+        sort, cursor, limit = get_rank_params(request)
+    except ValueError as err:
+        return HttpResponseBadRequest(str(err))
+
+    def get_data():
+        rows, max_date, next_cursor = get_global_rank(sort, cursor, limit)
+        # Columns instead of rows, the names of the fields are not repeated in every country
+        rank = {'date': str(max_date) if max_date else None, 'sort': sort, 'next': next_cursor}
+        for field in ['country', *CASES_FIELDS, 'mortality_tax', 'recovered_tax']:
+            rank[field] = [row[field] for row in rows]
+        return rank
+
+    rank = get_cached_data(f'rank_view:{request.GET.urlencode()}', get_data)
+
+    return JsonResponse(rank, json_dumps_params={'separators': (',', ':')})
+
+
+def get_heat_map_url():
+    """ Return the url of the current heat map, generated by the cron, None if it is not generated yet """
+    name = heat_maps.get_heat_map_name()
+    return reverse('Heat Map File', args=[name]) if name else None
 
 
 def heatmap_view(request):
-    """ For showing heat map."""
+    """ For showing heat map. The page only embeds the file with the map """
 
     logging.info(f'{os.getenv("ID_LOG", "")} Showing the heat map')
     template_name = 'covid19data/heat_map.html'
 
-    return render(request, template_name)
+    return render(request, template_name, {'heat_map_url': get_heat_map_url()})
 
 
-def graph_view(request, graph_type='confirmed'):
+def get_heat_map_etag(request, name):
+    """ Return the ETag of a heat map file, the hash of its content with the encoding served """
+    return f'{name}-{heat_maps.get_heat_map_path(name, request.headers.get("Accept-Encoding", ""))[1]}'
+
+
+@xframe_options_sameorigin
+def heat_map_file_view(request, name):
+    """
+    For serving the file of the heat map embedded by the heat map page. The name has the hash of the content,
+    so the current heat map is cached forever, and the names of the old heat maps redirect to the current one
+    """
+    current = heat_maps.get_heat_map_name()
+    if current is None:
+        raise Http404('The heat map is not generated yet')
+    if name != current:
+        return redirect('Heat Map File', current)
+    return serve_heat_map(request, name)
+
+
+@cache_control(public=True, max_age=31536000, immutable=True)
+@etag(get_heat_map_etag)
+def serve_heat_map(request, name):
+    """ Return the file of a heat map, compressed when the client accepts it """
+    path, encoding = heat_maps.get_heat_map_path(name, request.headers.get('Accept-Encoding', ''))
+    try:
+        response = FileResponse(open(path, 'rb'), content_type='text/html; charset=utf-8')
+    except FileNotFoundError:
+        # The cron has replaced the heat map after reading its name
+        raise Http404('The heat map is not generated yet')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@cache_view
+def graph_view(request, graph_type='confirmed', country=None):
     """
     Showing graphs about data
     :param request: Request
     :param graph_type: What type of graph to show: confirmed, recovered o deaths
+    :param country: Country of the graph rendered on demand, None for the global graph rendered by the cron
     """
-    logging.info(f'{os.getenv("ID_LOG", "")} Showing graph for {graph_type} cases')
+    logging.info(f'{os.getenv("ID_LOG", "")} Showing graph for {graph_type} cases of {country or "Global"}')
 
+    # The graph is drawn in the browser with the series API, the images are only for the browsers without JS
+    field, label, color = graphs.GRAPH_TYPES.get(graph_type, graphs.GRAPH_TYPES['death'])
     template_name = 'covid19data/graph.html'
 
-    return render(request, template_name, {'graph_type': graph_type})
+    return render(request, template_name, {'graph_type': graph_type, 'country': country, 'field': field,
+                                           'label': label, 'color': color})
+
+
+def get_graph_etag(request, graph_type, country):
+    """ Return the ETag of a graph image, it only changes with the data generation """
+    return f'{get_data_generation()}-{graph_type}-{slugify(country)}-{request.GET.get("format", "png")}'
+
+
+@cache_control(public=True, no_cache=True)
+@etag(get_graph_etag)
+def graph_image_view(request, graph_type, country):
+    """
+    Return the image of a graph of a country, rendered on demand and cached by data generation
+    :param request: Request, with the param format (png or svg)
+    :param graph_type: What type of graph to show: confirmed, recovered o death
+    :param country: Country name or Global
+    """
+    image_format = request.GET.get('format', 'png')
+    if graph_type not in graphs.GRAPH_TYPES or image_format not in IMAGE_FORMATS:
+        raise Http404(f'Graph {graph_type} in {image_format} not found')
+
+    image = get_graph_image(country, graph_type, get_data_generation(), image_format)
+    if image is None:
+        raise Http404(f'No data for {country}')
+
+    return HttpResponse(image, content_type=IMAGE_FORMATS[image_format])
+
+
+def get_series(_country, _fields=CASES_FIELDS, _date_from=None, _date_to=None, _delta=False, _mean=None):
+    """
+    Get the series per date of a country from the rollups, with a list of values for every field
+    :param _country: Country name in any case or Global
+    :param _fields: Cases fields of the series
+    :param _date_from: First date, all the dates if None
+    :param _date_to: Last date, all the dates if None
+    :param _delta: True for the new cases of every date instead of the accumulated cases
+    :param _mean: Days (7 or 14) of the rolling mean of the new cases, None for no mean
+    :return: Return a dict with the list of dates and a list of values for every field, the same length
+    """
+    try:
+        logging.info(f'{os.getenv("ID_LOG", "")} Getting series of {_country}')
+
+        # The canonical name of the country is searched by its key in lowercase, like in the detail view
+        country = get_country_name(_country)
+        # The new cases and their means are calculated by the ingest in the trends
+        if _mean or _delta:
+            prefix = f'avg{_mean}_' if _mean else 'new_'
+            queryset = DailyTrend.objects.filter(country=country)
+        else:
+            prefix = ''
+            queryset = GlobalDaily.objects.all() if country == GLOBAL else \
+                CountryDaily.objects.filter(country=country)
+        if country is None:
+            queryset = queryset.none()
+        if _date_from:
+            queryset = queryset.filter(date__gte=_date_from)
+        if _date_to:
+            queryset = queryset.filter(date__lte=_date_to)
+        rows = list(queryset.order_by('date').values_list('date', *[f'{prefix}{field}' for field in _fields]))
+
+        # Columns instead of rows, the names of the fields are not repeated in every date
+        columns = list(zip(*rows)) or [[] for _ in range(len(_fields) + 1)]
+        series = {'country': country or _country, 'delta': _delta, 'mean': _mean,
+                  'date': [str(day) for day in columns[0]]}
+        for field, values in zip(_fields, columns[1:]):
+            series[field] = list(values)
+        return series
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
+
+
+def get_series_etag(request, country):
+    """ Return the ETag of a series, it only changes with the data generation and the params """
+    return f'{get_data_generation()}-{slugify(country)}-{hashlib.md5(request.GET.urlencode().encode()).hexdigest()}'
+
+
+@gzip_page
+@cache_control(public=True, no_cache=True)
+@etag(get_series_etag)
+def series_view(request, country):
+    """
+    Return in JSON the series per date of a country or Global
+    :param request: Request, with the params fields (comma separated), from and to (YYYY-MM-DD),
+    delta (1 for the new cases of every date) and mean (7 or 14 for the rolling mean of the new cases)
+    :param country: Country name or Global
+    """
+    logging.info(f'{os.getenv("ID_LOG", "")} Showing the series of {country}')
+
+    fields = request.GET.get('fields', ','.join(CASES_FIELDS)).split(',')
+    try:
+        date_from, date_to = [date.fromisoformat(request.GET[param]) if request.GET.get(param) else None
+                              for param in ['from', 'to']]
+    except ValueError:
+        return HttpResponseBadRequest('The dates must be YYYY-MM-DD')
+    if not set(fields) <= set(CASES_FIELDS):
+        return HttpResponseBadRequest(f'The fields must be in {",".join(CASES_FIELDS)}')
+
+    mean = request.GET.get('mean')
+    if mean and mean not in [str(window) for window in TREND_WINDOWS]:
+        return HttpResponseBadRequest(f'The mean must be in {",".join(str(window) for window in TREND_WINDOWS)}')
+
+    series = get_cached_data(f'series_view:{country}:{request.GET.urlencode()}',
+                             lambda: get_series(country, fields, date_from, date_to, request.GET.get('delta') == '1',
+                                                int(mean) if mean else None))
+    if not series['date'] and not (date_from or date_to):
+        raise Http404(f'No data for {country}')
+
+    return JsonResponse(series, json_dumps_params={'separators': (',', ':')})
@@ -37,12 +37,69 @@ SQLITE=N
 ALLOWED_HOSTS=
 
 URL_CSV_FILES=https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_daily_reports
-# If RELOAD is Y delete and load new data from DAY_FROM/MONTH_FROM/YEAR_FROM (not included)
+# If RELOAD is Y load the data from DAY_FROM/MONTH_FROM/YEAR_FROM (not included)
 # If RELOAD is N the cron only load the current day data
+# Only the files which are new or changed since the last load are saved in DB
 RELOAD=N
 DAY_FROM=20
 MONTH_FROM=11
 YEAR_FROM=2020
+# INGEST_MODE=UPSERT inserts or updates the rows by location and date, BATCH_SIZE rows per INSERT
+# The rest of modes replace the dates of every file: INGEST_MODE=ROW saves every row with its own INSERT,
+# INGEST_MODE=BULK saves BATCH_SIZE rows per INSERT and INGEST_MODE=COPY uses COPY FROM STDIN
+# (PostgreSQL only, with SQLITE=Y it works as BULK)
+INGEST_MODE=UPSERT
+BATCH_SIZE=1000
+# Number of files downloading at the same time and timeout in seconds for every download
+FETCH_WORKERS=4
+FETCH_TIMEOUT=30
+# Maximum number of files in memory at the same time while loading, downloaded or waiting to be saved
+INGEST_FRAMES=4
+# Local cache of the CSV files (empty for no cache), revalidated with the server after CSV_CACHE_TTL seconds
+CSV_CACHE_DIR=csv_cache
+CSV_CACHE_TTL=3600
+
+# Cache of the views: backend (for example django.core.cache.backends.filebased.FileBasedCache with a folder
+# in CACHE_LOCATION) and seconds in cache of the data and of the data generation read from DB
+CACHE_BACKEND=django.core.cache.backends.locmem.LocMemCache
+CACHE_LOCATION=covid19web
+VIEW_CACHE_TIMEOUT=86400
+DATA_GENERATION_TIMEOUT=60
+
+# Archive of the data saved by the ingest, an Arrow IPC file for every date in a folder for every month (empty
+# for no archive, it needs pyarrow). The command rebuild_from_archive loads the DB from it without downloads
+ARCHIVE_DIR=archive
+
+# Months after the current one with their partition created in advance by the command partition_data
+# (PostgreSQL only, after changing the table with partition_data --convert)
+PARTITION_MONTHS_AHEAD=3
+
+# Countries in every page of the global rank
+RANK_PAGE_SIZE=50
+
+# Heat map: days until the last date, field for the weight (confirmed_cases, active_cases...) and
+# size in degrees of the grid for joining near locations (0 without grid)
+HEATMAP_DAYS=1
+HEATMAP_WEIGHT=confirmed_cases
+HEATMAP_GRID=0
+# Folder of the heat maps generated by the cron, served by the view of the heat map
+HEAT_MAP_DIR=heat_map
+
+# Graphs: processes for rendering the global graphs. A graph is only rendered again when its data changes
+GRAPH_WORKERS=4
+# Graphs of the countries rendered on demand: images in the memory of every process, folder for the images
+# shared by the processes (empty for no cache in disk) and maximum number of images in the folder
+GRAPH_CACHE_SIZE=256
+GRAPH_CACHE_DIR=graph_cache
+GRAPH_CACHE_FILES=2000
+
+# Jobs of the command run_jobs --schedule (ingest, retention, graphs and heat map): hour of the daily run and
+# file of the lock for only one run at the same time (in PostgreSQL the lock is in the DB)
+JOBS_HOUR=12
+JOBS_LOCK_FILE=jobs.lock
+# Months of data kept in the DB by the retention job, with the current one (empty for keeping all the data).
+# With the table partitioned the old months are dropped whole
+RETENTION_MONTHS=
 
 # Heroku
 DJANGO_SETTINGS_MODULE=covid19web.settings
@@ -112,6 +112,14 @@ if os.getenv('SQLITE', default='N').upper() == 'Y':
 
 print(f'DATABASES: {DATABASES["default"]}')
 
+# Cache for the data and responses of the views, they are versioned by the data generation of the ingest
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'covid19web'),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -155,6 +163,9 @@ STATICFILES_DIRS = [
 # https://warehouse.python.org/project/whitenoise/
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# The heat map generated by the cron is not a static file, it is served from HEAT_MAP_DIR by the
+# heat map view, cached forever by the hash in its name
+
 # Activate Django-Heroku.
 django_heroku.settings(locals())
 
@@ -4,17 +4,19 @@ Every file for a day has the data with date day + 1. Except in the files for Mar
 For example, the file .../csse_covid_19_daily_reports/11-18-2020.csv brings data with date 2020/11/19
 """
 
+import io
 import logging
 import os
 import sys
-from urllib.error import HTTPError
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.schedulers.background import BackgroundScheduler
-import pandas as pd
 import numpy as np
+import pandas as pd
 from dotenv import load_dotenv, find_dotenv
-from datetime import date
-from dateutil.parser import parse
+from datetime import date, datetime, timedelta
 from colorama import Fore, Back
 
 # If you’re using components of Django “standalone” – for example, writing a Python script which
@@ -27,7 +29,12 @@ django.setup()
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config_fk import SETUP_DATA
-from app_covid19data.models import DataCovid19Item
+from cron import csv_cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+from app_covid19data import archive, caching, partitions, rollups
+from app_covid19data.models import DataCovid19Item, IngestLedger, Country, Location, CountryDaily
 
 URL_CSV_FILES = os.getenv('URL_CSV_FILES')
 COL_STATE = 'Province_State'
@@ -40,7 +47,56 @@ COL_DEAD_CASES = 'Deaths'
 COL_RECOVERED_CASES = 'Recovered'
 COL_ACTIVE_CASES = 'Active'
 COL_INCIDENCE_RATE = 'Incidence_Rate'
-COL_CASE_FATALITY_RATIO = 'Case-Facility_Ratio'
+COL_CASE_FATALITY_RATIO = 'Case_Fatality_Ratio'
+
+# Columns of the files and the DataCovid19Item fields where they are saved
+INTEGER_COLS = {COL_CONFIRMED_CASES: 'confirmed_cases',
+                COL_DEAD_CASES: 'dead_cases',
+                COL_RECOVERED_CASES: 'recovered_cases',
+                COL_ACTIVE_CASES: 'active_cases'}
+FLOAT_COLS = {COL_INCIDENCE_RATE: 'incidence_rate',
+              COL_CASE_FATALITY_RATIO: 'case_fatality_ratio'}
+# Columns of the files saved in the Location of every row
+LOCATION_COLS = {COL_LATITUDE: 'latitude',
+                 COL_LONGITUDE: 'longitude'}
+# Some columns not always exists in the files, in this case they are saved with 0
+OPTIONAL_COLS = [COL_ACTIVE_CASES, COL_INCIDENCE_RATE, COL_CASE_FATALITY_RATIO]
+# Every name of the columns in the history of the files with the name used in the dataframes. The rest
+# of columns (FIPS, Admin2, Combined_Key...) are not read
+COLUMN_ALIASES = {**{col: col for col in [COL_STATE, COL_COUNTRY, COL_LAST_UPDATE, *INTEGER_COLS, *FLOAT_COLS,
+                                          *LOCATION_COLS]},
+                  'Province/State': COL_STATE,
+                  'Country/Region': COL_COUNTRY,
+                  'Last Update': COL_LAST_UPDATE,
+                  'Lat': COL_LATITUDE,
+                  'Long_': COL_LONGITUDE,
+                  'Incident_Rate': COL_INCIDENCE_RATE,
+                  'Case-Fatality_Ratio': COL_CASE_FATALITY_RATIO}
+# Types of the columns: the names repeated in every row are categories and the cases nullable integers
+COLUMN_DTYPES = {COL_STATE: 'category', COL_COUNTRY: 'category', COL_LAST_UPDATE: 'category',
+                 **{col: 'Int64' for col in INTEGER_COLS}, **{col: 'float64' for col in [*FLOAT_COLS, *LOCATION_COLS]}}
+# Natural key of DataCovid19Item
+KEY_FIELDS = ['location_id', 'date']
+
+# In-memory lookup of the locations by (country key, state) with their ids, and the coordinates of every
+# location id, filled from the DB when a file has a location not found
+LOCATIONS = {}
+COORDINATES = {}
+
+# INGEST_MODE: UPSERT inserts or updates the rows by its natural key in batches of BATCH_SIZE.
+# ROW, BULK and COPY replace the dates of every file: ROW saves every row with its own INSERT, BULK
+# saves the rows in batches of BATCH_SIZE and COPY streams the rows with COPY FROM STDIN (only
+# PostgreSQL, in other DB it works as BULK)
+INGEST_MODE = os.getenv('INGEST_MODE', 'UPSERT').upper()
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', 1000))
+# Number of files downloading at the same time and timeout in seconds for every download
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', 4))
+FETCH_TIMEOUT = float(os.getenv('FETCH_TIMEOUT', 30))
+# Maximum number of dataframes in memory at the same time while loading, downloaded or waiting to be saved
+INGEST_FRAMES = int(os.getenv('INGEST_FRAMES', FETCH_WORKERS))
+# Months of data kept in the DB by the retention job, with the current one. The data of the months before is
+# deleted (empty for keeping all the data)
+RETENTION_MONTHS = os.getenv('RETENTION_MONTHS', '')
 
 PATH_MAP = '../templates/covid19data/'
 PATH_GRAPH = '../static/covid19web/img/'
@@ -52,20 +108,48 @@ load_dotenv(find_dotenv())
 logging.basicConfig(level=os.getenv('LOG_LEVEL', 'ERROR'))
 
 
-def delete_data(_year_from, _month_from, _day_from=1):
+def clean_deleted_dates(_date_from, _date_to):
+    """
+    Remove the bookkeeping of the dates whose data has been deleted from the DB, in the transaction of the
+    delete: the files with data of those dates in the ingest ledger, so they are saved again when they are
+    loaded, and the rollups of the dates
+    :param _date_from: First date deleted, all the dates before the last one if None
+    :param _date_to: Last date deleted
     """
-    Delete all the data in the DB with date before the date indicate in the params year, month and day
-    :param _day_from: Day from to delete
-    :param _year_from: Year from to delete
-    :param _month_from: Month from to delete
+    country_daily = CountryDaily.objects.filter(date__lte=_date_to)
+    ledger = IngestLedger.objects.filter(Q(first_date__lte=_date_to) |
+                                         Q(first_date__isnull=True, source_date__lte=_date_to))
+    if _date_from is not None:
+        country_daily = country_daily.filter(date__gte=_date_from)
+        # Without the dates of the data, the file of a day has usually the data of the next day
+        ledger = ledger.filter(Q(last_date__gte=_date_from) |
+                               Q(last_date__isnull=True, source_date__gte=_date_from - timedelta(days=1)))
+    dates = list(country_daily.values_list('date', flat=True).distinct().order_by())
+
+    ledger.delete()
+    rollups.refresh_rollups(dates)
+
+
+def delete_data(_date_before):
+    """
+    Delete all the data in the DB with date before a date, with the rollups and the files in the ingest ledger
+    of those dates. With the table partitioned the months before the date are dropped whole and only the rest
+    of rows are deleted.
+    :param _date_before: First date to keep
+    :return: Number of rows deleted, without the rows of the partitions dropped
     """
     try:
-        print(
-            f'{Fore.GREEN}Deleting rows in the DB with date field less than {_year_from}/{_month_from}/{_day_from}')
-        date_from = date(int(_year_from), int(_month_from), int(_day_from))
+        print(f'{Fore.GREEN}Deleting rows in the DB with date less than {_date_before}')
+
+        with transaction.atomic():
+            if partitions.is_partitioned():
+                dropped = partitions.drop_partitions(_date_before)
+                print(f'{Fore.GREEN}Successfully drop {len(dropped)} partitions in the DB')
 
-        # Delete return the number of rows deleted and by object type
-        number_delete = DataCovid19Item.objects.filter(update_date__lt=date_from).delete()
+            # Delete return the number of rows deleted and by object type
+            number_delete = DataCovid19Item.objects.filter(date__lt=_date_before).delete()
+            clean_deleted_dates(None, _date_before - timedelta(days=1))
+        caching.bump_data_generation()
 
     except Exception as err:
         logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
@@ -75,38 +159,67 @@ def delete_data(_year_from, _month_from, _day_from=1):
         raise
     else:
         print(f'{Fore.GREEN}Successfully delete {number_delete[0]} rows in the DB')
+        return number_delete[0]
 
 
-def save_data(df):
-    """ Method to save data of dataframe in DB """
+def truncate_month(_month):
+    """
+    Empty the data of a month before reloading it, with its rollups and its files in the ingest ledger, so
+    the next load saves them again. With the table partitioned the partition of the month is truncated
+    instead of deleting its rows.
+    :param _month: Any date of the month
+    :return: Name of the partition truncated, None if the rows are deleted
+    """
     try:
-        # Get the colimns names because not always has all the columns
-        name_cols = [col for col in df.columns]
-        # Go over the dataframe df and save every row
-        for index, row in df.iterrows():
-            item = DataCovid19Item(country=row[COL_COUNTRY],
-                                   state=row[COL_STATE],
-                                   latitude=row[COL_LATITUDE],
-                                   longitude=row[COL_LONGITUDE],
-                                   confirmed_cases=row[COL_CONFIRMED_CASES],
-                                   dead_cases=row[COL_DEAD_CASES],
-                                   recovered_cases=row[COL_RECOVERED_CASES],
-                                   )
-            # Parser the date
-            item.date = parse(row[COL_LAST_UPDATE]).date()
-
-            # Some columns not always exists in the files
-            item.active_cases = row[COL_ACTIVE_CASES] if 'Active' in name_cols else 0
-            item.incidence_rate = row[COL_INCIDENCE_RATE] if 'Incidence_Rate' in name_cols else 0
-            item.case_fatality_ratio = row[COL_CASE_FATALITY_RATIO] if 'Case-Facility_Ratio' in name_cols else 0
+        month_from = partitions.get_month(_month)
+        month_to = partitions.add_months(month_from) - timedelta(days=1)
+        print(f'{Fore.GREEN}Emptying the data in the DB of the month {month_from:%Y-%m}')
+
+        with transaction.atomic():
+            name = partitions.truncate_partition(month_from) if partitions.is_partitioned() else None
+            if name is None:
+                DataCovid19Item.objects.filter(date__range=(month_from, month_to)).delete()
+            clean_deleted_dates(month_from, month_to)
+        caching.bump_data_generation()
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
+    else:
+        return name
+
 
+def retention_job():
+    """ Delete the data of the months before the last RETENTION_MONTHS months, nothing if it is empty """
+    if not RETENTION_MONTHS:
+        print(f'{Fore.GREEN}Without RETENTION_MONTHS all the data is kept in the DB')
+        return None
+    # The date is the first day of a month, so with the table partitioned the old months are dropped whole
+    return delete_data(partitions.add_months(partitions.get_month(date.today()), 1 - int(RETENTION_MONTHS)))
+
+
+def save_data(df, df_model=None):
+    """
+    Method to save data of dataframe in DB, one INSERT for every row
+    :param df: Dataframe with the data of a file
+    :param df_model: Dataframe already prepared with prepare_data, prepared from df if None
+    :return: The last date saved
+    """
+    row = None
+    try:
+        df_model = prepare_data(df) if df_model is None else df_model
+        # Go over the dataframe df and save every row
+        for row in df_model.to_dict('records'):
+            item = DataCovid19Item(**row)
             item.save()
 
-        return item.date
+        return df_model['date'].max() if len(df_model) else None
 
     except Exception as err:
-        logging.error(f'\nIndex={index} \n'
-                      f'Row:\n{row} \n'
+        logging.error(f'\nRow:\n{row} \n'
                       f'Line: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
@@ -116,6 +229,292 @@ def save_data(df):
         logging.debug(f'Successfully saved the df block')
 
 
+def get_source_date(_url):
+    """ Return the date in the name of a daily file (MM-DD-YYYY.csv) or None """
+    try:
+        return datetime.strptime(os.path.basename(_url).split('.')[0], '%m-%d-%Y').date()
+    except ValueError:
+        return None
+
+
+def parse_dates(_column):
+    """
+    Parse the dates of a column in vectorized form, only once every different date instead of every row
+    :param _column: Series with the dates as text
+    :return: Series with the dates, None in the rows without date
+    """
+    column = _column.astype('category')
+    dates = pd.to_datetime(column.cat.categories.astype(str), format='mixed').date
+    # The code of a missing value is -1, the None added after the dates
+    return pd.Series(np.append(dates, None)[column.cat.codes], index=_column.index)
+
+
+def reset_locations():
+    """ Empty the in-memory lookup of the locations, for example after a rollback of new locations """
+    LOCATIONS.clear()
+    COORDINATES.clear()
+
+
+def get_location_ids(_df_locations):
+    """
+    Return the location id of every country and state from the in-memory lookup. The new countries and
+    locations are created in DB, the names of a country with other case are the same country. The coordinates
+    of the locations are updated when they change.
+    :param _df_locations: Dataframe with country, state, latitude and longitude, one row for every location
+    :return: List of location ids
+    """
+    keys = list(zip(_df_locations['country'].str.lower(), _df_locations['state']))
+
+    df_new = _df_locations[[key not in LOCATIONS for key in keys]]
+    if len(df_new):
+        Country.objects.bulk_create([Country(name=country, key=country.lower())
+                                     for country in df_new['country'].unique()],
+                                    batch_size=BATCH_SIZE, ignore_conflicts=True)
+        country_ids = dict(Country.objects.filter(key__in=df_new['country'].str.lower().unique())
+                           .values_list('key', 'id'))
+        Location.objects.bulk_create([Location(country_id=country_ids[row['country'].lower()], state=row['state'])
+                                      for row in df_new.to_dict('records')],
+                                     batch_size=BATCH_SIZE, ignore_conflicts=True)
+        for key, state, location_id, latitude, longitude in Location.objects.filter(
+                country_id__in=country_ids.values()).values_list('country__key', 'state', 'id', 'latitude',
+                                                                 'longitude'):
+            LOCATIONS[(key, state)] = location_id
+            COORDINATES[location_id] = (latitude, longitude)
+
+    locations = []
+    for key, latitude, longitude in zip(keys, _df_locations['latitude'], _df_locations['longitude']):
+        location_id = LOCATIONS[key]
+        if not (pd.isna(latitude) or pd.isna(longitude)) and COORDINATES[location_id] != (latitude, longitude):
+            COORDINATES[location_id] = (latitude, longitude)
+            locations.append(Location(id=location_id, latitude=latitude, longitude=longitude))
+    Location.objects.bulk_update(locations, ['latitude', 'longitude'], batch_size=BATCH_SIZE)
+
+    return [LOCATIONS[key] for key in keys]
+
+
+def prepare_data(df):
+    """
+    Transform the columns of a dataframe with the data of a file in the DataCovid19Item fields
+    in vectorized form, with only one row for every natural key (location, date): the amounts
+    are added and the rates are averaged. NaN values are changed for None column by column.
+    The location of every row is resolved with the in-memory lookup and its coordinates are the average.
+    :param df: Dataframe with the columns names unified by check_df
+    :return: Dataframe with a column for every DataCovid19Item field
+    """
+    df_model = pd.DataFrame(index=df.index)
+    df_model['country'] = df[COL_COUNTRY].astype(object)
+    # Without state the value is '' because NULL values are always different in the unique constraint
+    df_model['state'] = df[COL_STATE].astype(object).fillna('') if COL_STATE in df.columns else ''
+
+    df_model['date'] = parse_dates(df[COL_LAST_UPDATE])
+    # The rows without date have no natural key, they are discarded
+    without_date = df_model['date'].isna()
+    if without_date.any():
+        logging.warning(f'{os.getenv("ID_LOG", "")} Discarded {without_date.sum()} rows without {COL_LAST_UPDATE}')
+        df_model = df_model[~without_date]
+
+    for col, field in {**INTEGER_COLS, **FLOAT_COLS, **LOCATION_COLS}.items():
+        if col not in df.columns and col in OPTIONAL_COLS:
+            df_model[field] = 0
+            continue
+        df_model[field] = pd.to_numeric(df[col], errors='coerce')
+
+    df_locations = df_model.groupby(['country', 'state'], sort=False)[list(LOCATION_COLS.values())].mean() \
+        .reset_index()
+    df_locations['location_id'] = get_location_ids(df_locations)
+    df_model = df_model.merge(df_locations[['country', 'state', 'location_id']], on=['country', 'state'])
+
+    # Some files have several rows for a state, for example the counties in US
+    grouped = df_model.groupby(KEY_FIELDS, sort=False)
+    df_model = pd.concat([grouped[list(INTEGER_COLS.values())].sum(min_count=1).round().astype('Int64'),
+                          grouped[list(FLOAT_COLS.values())].mean()], axis=1).reset_index()
+
+    for field in [*INTEGER_COLS.values(), *FLOAT_COLS.values()]:
+        df_model[field] = df_model[field].astype(object).where(df_model[field].notna(), None)
+
+    return df_model
+
+
+def save_data_bulk(df, batch_size=BATCH_SIZE, df_model=None):
+    """
+    Method to save data of dataframe in DB in batches of rows, all the dataframe in one transaction
+    :param df: Dataframe with the data of a file
+    :param batch_size: Number of rows in every INSERT
+    :param df_model: Dataframe already prepared with prepare_data, prepared from df if None
+    :return: The last date saved
+    """
+    try:
+        start = time.perf_counter()
+        df_model = prepare_data(df) if df_model is None else df_model
+        items = [DataCovid19Item(**row) for row in df_model.to_dict('records')]
+
+        with transaction.atomic():
+            DataCovid19Item.objects.bulk_create(items, batch_size=batch_size)
+
+        elapsed = time.perf_counter() - start
+        print(f'{Fore.GREEN}Saved {len(items)} rows in {elapsed:.2f} s '
+              f'({len(items) / elapsed if elapsed else 0:,.0f} rows/sec)')
+
+        return df_model['date'].max() if len(df_model) else None
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
+
+
+def save_data_copy(df, df_model=None):
+    """
+    Method to save data of dataframe in DB with COPY FROM STDIN through an in-memory CSV buffer.
+    COPY is only available in PostgreSQL, with another DB (SQLITE=Y) the data is saved with save_data_bulk
+    :param df: Dataframe with the data of a file
+    :param df_model: Dataframe already prepared with prepare_data, prepared from df if None
+    :return: The last date saved
+    """
+    if connection.vendor != 'postgresql':
+        logging.info(f'COPY is not available in {connection.vendor}, saving the data in bulk mode')
+        return save_data_bulk(df, df_model=df_model)
+
+    try:
+        start = time.perf_counter()
+        df_model = (prepare_data(df) if df_model is None else df_model).assign(update_date=now())
+
+        # In COPY with CSV format an empty value without quotes is NULL
+        buffer = io.StringIO()
+        df_model.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {DataCovid19Item._meta.db_table} ({", ".join(df_model.columns)}) '
+                               f'FROM STDIN WITH (FORMAT csv)', buffer)
+
+        elapsed = time.perf_counter() - start
+        print(f'{Fore.GREEN}Copied {len(df_model)} rows in {elapsed:.2f} s '
+              f'({len(df_model) / elapsed if elapsed else 0:,.0f} rows/sec)')
+
+        return df_model['date'].max() if len(df_model) else None
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
+
+
+def save_data_upsert(df, batch_size=BATCH_SIZE, df_model=None):
+    """
+    Method to save data of dataframe in DB inserting the new rows and updating the rows which already
+    exist with the same natural key (location, date), all the dataframe in one transaction
+    :param df: Dataframe with the data of a file
+    :param batch_size: Number of rows in every INSERT
+    :param df_model: Dataframe already prepared with prepare_data, prepared from df if None
+    :return: The last date saved
+    """
+    try:
+        start = time.perf_counter()
+        df_model = prepare_data(df) if df_model is None else df_model
+
+        update_date = now()
+        fields = [*df_model.columns, 'update_date']
+        rows = [(*row, update_date) for row in df_model.itertuples(index=False, name=None)]
+        # The DB limits the number of parameters in a query
+        batch_size = min(batch_size, connection.ops.bulk_batch_size(fields, rows) or batch_size)
+
+        # INSERT ... ON CONFLICT works in PostgreSQL and SQLite
+        values_row = f'({", ".join(["%s"] * len(fields))})'
+        sql_update = ', '.join(f'{field} = excluded.{field}' for field in fields if field not in KEY_FIELDS)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for index in range(0, len(rows), batch_size):
+                batch = rows[index:index + batch_size]
+                cursor.execute(f'INSERT INTO {DataCovid19Item._meta.db_table} ({", ".join(fields)}) '
+                               f'VALUES {", ".join([values_row] * len(batch))} '
+                               f'ON CONFLICT ({", ".join(KEY_FIELDS)}) DO UPDATE SET {sql_update}',
+                               [value for row in batch for value in row])
+
+        elapsed = time.perf_counter() - start
+        print(f'{Fore.GREEN}Upserted {len(rows)} rows in {elapsed:.2f} s '
+              f'({len(rows) / elapsed if elapsed else 0:,.0f} rows/sec)')
+
+        return df_model['date'].max() if len(df_model) else None
+
+    except Exception as err:
+        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
+                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
+                      f'Type Error: {type(err).__name__} \n'
+                      f'Arguments:\n {err.args}')
+        raise
+
+
+# Methods to save the data of a file in DB for every INGEST_MODE
+SAVE_METHODS = {
+    'ROW': save_data,
+    'BULK': save_data_bulk,
+    'COPY': save_data_copy,
+    'UPSERT': save_data_upsert,
+}
+
+
+def delete_rows(_df_model, batch_size=BATCH_SIZE):
+    """
+    Delete the rows in DB with the natural keys (location, date) of a dataframe, before saving them again.
+    The rows of other locations in the same dates are kept, because a file does not always have all the
+    locations of its dates.
+    :param _df_model: Dataframe returned by prepare_data
+    :param batch_size: Number of locations in every DELETE
+    :return: Number of rows deleted
+    """
+    deleted = 0
+    for day, location_ids in _df_model.groupby('date', sort=False)['location_id']:
+        location_ids = list(location_ids)
+        for i in range(0, len(location_ids), batch_size):
+            deleted += DataCovid19Item.objects.filter(date=day,
+                                                      location_id__in=location_ids[i:i + batch_size]).delete()[0]
+    return deleted
+
+
+def save_file(_url, _df, _content_hash):
+    """
+    Save the data of a file in DB in one transaction, with the file in the ingest ledger and the rollups
+    of the dates in the file, and after that in the archive. With INGEST_MODE different from UPSERT the rows
+    of the locations and dates in the file are replaced.
+    :param _url: Url of the file
+    :param _df: Dataframe with the data of the file
+    :param _content_hash: Hash of the file content
+    :return: The last date saved
+    """
+    dates = list(parse_dates(_df[COL_LAST_UPDATE]).dropna().unique())
+    try:
+        with transaction.atomic():
+            partitions.ensure_partitions(dates)
+            # The data is prepared only once, for deleting the rows it replaces and for saving it
+            df_model = prepare_data(_df)
+            if INGEST_MODE != 'UPSERT':
+                delete_rows(df_model)
+
+            date_saved = SAVE_METHODS.get(INGEST_MODE, save_data_upsert)(_df, df_model=df_model)
+            rollups.refresh_rollups(dates)
+
+            IngestLedger.objects.update_or_create(url=_url, defaults={'source_date': get_source_date(_url),
+                                                                      'first_date': min(dates, default=None),
+                                                                      'last_date': max(dates, default=None),
+                                                                      'content_hash': _content_hash,
+                                                                      'row_count': len(_df),
+                                                                      'update_date': now()})
+    except Exception:
+        # The locations created in the transaction are not in DB anymore
+        reset_locations()
+        raise
+
+    # The archive has the data saved, for rebuilding the DB without downloading the files again
+    if archive.is_enabled():
+        archive.write_dates(dates)
+    return date_saved
+
+
 def create_list_urls(_year_from=2020, _month_from=3, _day_from=1):
     """
     Load all the urls of daily data of a specific year and from a specific month
@@ -182,83 +581,151 @@ def create_list_urls(_year_from=2020, _month_from=3, _day_from=1):
         return _list_urls
 
 
-def check_list(_list_data):
-    """ Unify the column name in a list for some columns because at the beginning the name was different """
+def check_df(_df_data):
+    """ Unify the column names in dataframe because the names changed in the history of the files """
     logging.debug('Rename some column name in dataframe')
     try:
-        for c in range(0, len(_list_data)):
-            _list_data[c].rename(columns={'Province/State': 'Province_State'}, inplace=True)
-            _list_data[c].rename(columns={'Country/Region': 'Country_Region'}, inplace=True)
-            _list_data[c].rename(columns={'Lat': 'Latitude'}, inplace=True)
-            _list_data[c].rename(columns={'Long_': 'Longitude'}, inplace=True)
-            _list_data[c].rename(columns={'Last Update': 'Last_Update'}, inplace=True)
+        _df_data.rename(columns=COLUMN_ALIASES, inplace=True)
+
     except Exception as err:
-        logging.error(f'\n_list_data={_list_data} \n'
+        logging.error(f'\n_df_data={_df_data} \n'
                       f'Line: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
         raise
     finally:
-        return _list_data
+        return _df_data
 
 
-def check_df(_df_data, clean_nan=False):
-    """ Unify the column name in dataframe for some columns because at the
-    beginning the name was different. If clean_nan the it changes NaN values with 0 """
-    logging.debug('Rename some column name in dataframe')
+def read_csv(_content):
+    """
+    Parse the content of a CSV file in a dataframe, only with the columns used and with their types
+    :param _content: Content of the file
+    :return: Dataframe with the columns names unified
+    """
+    usecols = COLUMN_ALIASES.__contains__
+    dtypes = {alias: COLUMN_DTYPES[col] for alias, col in COLUMN_ALIASES.items()}
     try:
-        _df_data.rename(columns={'Province/State': 'Province_State'}, inplace=True)
-        _df_data.rename(columns={'Country/Region': 'Country_Region'}, inplace=True)
-        _df_data.rename(columns={'Lat': 'Latitude'}, inplace=True)
-        _df_data.rename(columns={'Long_': 'Longitude'}, inplace=True)
-        _df_data.rename(columns={'Last Update': 'Last_Update'}, inplace=True)
+        df_data = pd.read_csv(io.BytesIO(_content), usecols=usecols, dtype=dtypes, on_bad_lines='skip')
+    except (TypeError, ValueError):
+        # Some cases are not integers, they are read as float and rounded when saved
+        dtypes.update({alias: 'float64' for alias, col in COLUMN_ALIASES.items() if col in INTEGER_COLS})
+        df_data = pd.read_csv(io.BytesIO(_content), usecols=usecols, dtype=dtypes, on_bad_lines='skip')
+    return check_df(df_data)
 
-        # Change NaN values for 0
-        if clean_nan:
-            _df_data.fillna(0)
 
-    except Exception as err:
-        logging.error(f'\n_df_data={_df_data} \n'
-                      f'Line: {err.__traceback__.tb_lineno} \n'
-                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
-                      f'Type Error: {type(err).__name__} \n'
-                      f'Arguments:\n {err.args}')
-        raise
-    finally:
-        return _df_data
+def read_url(_url, _timeout=FETCH_TIMEOUT):
+    """
+    Download a CSV file, using the local cache, and parse it in a dataframe
+    :param _url: Url to a CSV file data source, http(s):// or file://
+    :param _timeout: Timeout in seconds for the download
+    :return: Tuple (dataframe, content hash), (None, None) if the file is not found
+    """
+    content, content_hash = csv_cache.fetch(_url, _timeout)
+    if content is None:
+        return None, None
 
+    return read_csv(content), content_hash
 
-def load_data_urls(_list_urls):
+
+def fetch_data_urls(_list_urls, _workers=FETCH_WORKERS, _timeout=FETCH_TIMEOUT, _frames=INGEST_FRAMES):
     """
-    Load the data for every url list element
+    Download the files of the urls list in a thread pool. Every time a file is returned the next one starts
+    to download, so the downloads keep going while the caller saves the data in DB
     :param _list_urls: List where every element is a url to a CSV file data source
+    :param _workers: Maximum number of files downloading at the same time
+    :param _timeout: Timeout in seconds for every download
+    :param _frames: Maximum number of files downloaded or downloading and not returned yet
+    :return: Generator of tuples (url, dataframe, content hash) in the same order than the list, dataframe
+    is None if the file is not found
     """
+    urls = iter(_list_urls)
+    frames = max(1, _frames)
+    with ThreadPoolExecutor(max_workers=max(1, min(_workers, frames))) as executor:
+        pending = deque()
+        for url in urls:
+            pending.append((url, executor.submit(read_url, url, _timeout)))
+            if len(pending) == frames:
+                break
+
+        while pending:
+            url, future = pending.popleft()
+            next_url = next(urls, None)
+            if next_url is not None:
+                pending.append((next_url, executor.submit(read_url, next_url, _timeout)))
+            yield (url, *future.result())
+
+
+def normalize_frames(_frames):
+    """
+    Skip the files not found and unify the column names of the dataframes
+    :param _frames: Generator of tuples (url, dataframe, content hash)
+    :return: Generator of tuples (url, dataframe, content hash)
+    """
+    for url, df_data, content_hash in _frames:
+        if df_data is not None:
+            yield url, check_df(df_data), content_hash
 
-    logging.info(f'Start to get the data from urls and saving in DB')
 
-    _list_data = []
-    urls_count = 0
-    lines_count_df = 0
-    try:
-        for url in _list_urls:
-            try:
-                df_data = pd.read_csv(url, error_bad_lines=False)
-            except HTTPError:
-                logging.error(f'File not found: {url}')
+def write_frames(_frames):
+    """
+    Save in DB the dataframes of the files which are new or changed according to the ingest ledger
+    :param _frames: Generator of tuples (url, dataframe, content hash)
+    :return: Generator of tuples (url, dataframe, date saved), date saved is None if the file was not changed
+    """
+    for url, df_data, content_hash in _frames:
+        if IngestLedger.objects.filter(url=url, content_hash=content_hash).exists():
+            yield url, df_data, None
+        else:
+            yield url, df_data, save_file(url, df_data, content_hash)
+
 
-            # Review df with correct columns names and NaN values
-            df_data = check_df(df_data, clean_nan=True)
+def fold_totals(_totals, _df_data, _date_saved):
+    """
+    Add a file to the running totals of the load. The files have the accumulated cases until their day,
+    so the cases of the totals are the ones of the last file
+    :param _totals: Dict with the running totals
+    :param _df_data: Dataframe of the file
+    :param _date_saved: Date saved of the file, None if it was not changed
+    :return: Dict with the running totals
+    """
+    _totals['files'] += 1
+    if _date_saved is not None:
+        _totals['rows_saved'] += len(_df_data)
+        _totals['date_saved'] = _date_saved
+    for column, field in [(COL_DEAD_CASES, 'dead_cases'), (COL_CONFIRMED_CASES, 'confirmed_cases'),
+                          (COL_RECOVERED_CASES, 'recovered_cases')]:
+        _totals[field] = _df_data[column].sum() if column in _df_data else 0
+    return _totals
 
-            np.array(df_data)
-            _list_data.append(df_data)
 
-            date_saved = save_data(df_data)
+def load_data_urls(_list_urls):
+    """
+    Load the data for every url list element, as a pipeline of generators (download, normalize, save
+    in DB and fold the totals), so only INGEST_FRAMES dataframes are in memory at the same time. The files
+    with the same content than the last time they were loaded, according to the ingest ledger, are not
+    saved again
+    :param _list_urls: List where every element is a url to a CSV file data source
+    :return: Dict with the number of files loaded, the rows saved, the last date saved and the cases of
+    the last file
+    """
 
-            lines_count_df += len(df_data)
-            urls_count += 1
-            print(f'{Fore.GREEN}Processing URLs: {urls_count}/{len(_list_urls)}'
-                  f', Date: {date_saved} Total rows saved in DB: {lines_count_df}')
+    logging.info(f'Start to get the data from urls and saving in DB')
+    # The lookup of the locations is filled again from the DB in every load
+    reset_locations()
+
+    totals = {'files': 0, 'rows_saved': 0, 'date_saved': None,
+              'dead_cases': 0, 'confirmed_cases': 0, 'recovered_cases': 0}
+    url = None
+    try:
+        for url, df_data, date_saved in write_frames(normalize_frames(fetch_data_urls(_list_urls))):
+            totals = fold_totals(totals, df_data, date_saved)
+            if date_saved is None:
+                print(f'{Fore.GREEN}Processing URLs: {totals["files"]}/{len(_list_urls)}, file not changed: {url}')
+            else:
+                print(f'{Fore.GREEN}Processing URLs: {totals["files"]}/{len(_list_urls)}'
+                      f', Date: {date_saved} Total rows saved in DB: {totals["rows_saved"]}')
 
     except Exception as err:
         logging.error(f'\nVars: url={url} \n'
@@ -266,31 +733,9 @@ def load_data_urls(_list_urls):
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
-    finally:
-        return _list_data
-
-
-def generate_data_lists(_list_data):
-    """
-    Method for generate several lists for dead data, confirmed cases and recovered cases
-    :param _list_data: Data table with dead cases, confirmed cases and recovered cases
-    :return: Three lists with separated data
-    """
-
-    logging.info('Start to generate the different lists for dead, confirmed and recovered data')
-
-    # Create the lists for the graphs
-    _list_dead_cases = []
-    _list_confirmed_cases = []
-    _list_recovered_cases = []
-
-    # Sum the number of cases in every day
-    for i in range(0, len(_list_data)):
-        _list_dead_cases.append((_list_data[i]['Deaths']).sum())
-        _list_confirmed_cases.append((_list_data[i]['Confirmed']).sum())
-        _list_recovered_cases.append((_list_data[i]['Recovered']).sum())
+        raise
 
-    return _list_dead_cases, _list_confirmed_cases, _list_recovered_cases
+    return totals
 
 
 def covid19():
@@ -308,50 +753,52 @@ def covid19():
 
         list_urls = create_list_urls(year, month, day)
 
-        # Transform the urls in a dataframe and after that in a list
-        list_data = load_data_urls(list_urls)
-
-        # Rename some columns names
-        list_data = check_list(list_data)
-
-        # Get different lists for every kind of data, dead, confirmed cases and recovered cases
-        dead_cases, confirmed_cases, recovered_cases = generate_data_lists(list_data)
-
-        # Generate summary table
+        # Download and save the files, keeping only the totals of the load
+        start_load = now()
+        try:
+            totals = load_data_urls(list_urls)
+        finally:
+            # With new data the views can not use their data in cache anymore, also with the files saved
+            # before a file fails
+            if IngestLedger.objects.filter(update_date__gte=start_load).exists():
+                caching.bump_data_generation()
+
+        if not totals['files'] or not totals['confirmed_cases']:
+            print(f'{Fore.GREEN}No data files found for the summary table')
+            return
+
+        # Generate summary table with the cases of the last file
         resume_data = \
-            {'Dead cases': dead_cases[len(dead_cases) - 1],
-             'Confirmed cases': confirmed_cases[len(confirmed_cases) - 1],
-             'Recovered cases': recovered_cases[len(recovered_cases) - 1],
-             'Mortality tax':
-                 round(dead_cases[len(dead_cases) - 1] / confirmed_cases[len(confirmed_cases) - 1] * 100, 2),
-             'Recovered tax':
-                 round(recovered_cases[len(recovered_cases) - 1] / confirmed_cases[len(confirmed_cases) - 1] * 100, 2)
+            {'Dead cases': totals['dead_cases'],
+             'Confirmed cases': totals['confirmed_cases'],
+             'Recovered cases': totals['recovered_cases'],
+             'Mortality tax': round(totals['dead_cases'] / totals['confirmed_cases'] * 100, 2),
+             'Recovered tax': round(totals['recovered_cases'] / totals['confirmed_cases'] * 100, 2)
              }
 
         resume_data = pd.DataFrame(data=resume_data, index=[0])
 
         print(f'{Fore.GREEN}Summary table: \n {resume_data}')
 
-        # Deleting data from the date before loading date
-        delete_data(year, month, day)
-
     except Exception as err:
         logging.error(f'\nError at line: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
 
 
-# Schedule the cron
-print(f'{Fore.GREEN}********* START CRON COVID19 {SETUP_DATA["title"]} *********')
-cron_covid19 = BlockingScheduler()
-if os.getenv('ENV_PRO', 'Y') == 'Y':
-    print('Running in PRODUCTION environment')
-    cron_covid19.add_job(covid19, 'cron', hour='12')
-else:
-    print('Running in LOCAL environment')
-    cron_covid19.add_job(covid19, 'cron', minute='*')  # For testing in local set minute='*'
-cron_covid19.start()
+if __name__ == '__main__':
+    # Schedule the cron
+    print(f'{Fore.GREEN}********* START CRON COVID19 {SETUP_DATA["title"]} *********')
+    cron_covid19 = BlockingScheduler()
+    if os.getenv('ENV_PRO', 'Y') == 'Y':
+        print('Running in PRODUCTION environment')
+        cron_covid19.add_job(covid19, 'cron', hour='12')
+    else:
+        print('Running in LOCAL environment')
+        cron_covid19.add_job(covid19, 'cron', minute='*')  # For testing in local set minute='*'
+    cron_covid19.start()
 
 
 """
@@ -2,35 +2,56 @@
 Cron to generate graphs and heat map from DB data for COVID19
 """
 
+import gzip
+import hashlib
+import json
 import logging
 import os
 import sys
 from apscheduler.schedulers.blocking import BlockingScheduler
 from dotenv import load_dotenv, find_dotenv
-from datetime import date
+from datetime import date, timedelta
 from dateutil.parser import parse
-# Heat map and graphs
-from matplotlib import pyplot as plt
+# Heat map
 import folium
+import pandas as pd
 import math
 from folium.plugins import HeatMap
 from colorama import Fore
+try:
+    # Brotli is optional, without it the heat map is only compressed with gzip
+    import brotli
+except ImportError:
+    brotli = None
 
 # If you’re using components of Django “standalone” – for example, writing a Python script which
 # loads some Django components
 # https://docs.djangoproject.com/en/3.1/topics/settings/#custom-default-settings
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'covid19web.settings')
 import django
-from django.db.models import Sum
+from django.db.models import Max, F
 
 django.setup()
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config_fk import SETUP_DATA
-from app_covid19data.models import DataCovid19Item
-
-PATH_MAP = 'templates/covid19data/'
+from app_covid19data import graphs
+from app_covid19data import archive
+from app_covid19data import heat_maps
+from app_covid19data.models import DataCovid19Item, GlobalDaily
+from app_covid19data.rollups import CASES_FIELDS
+
+PATH_HEAT_MAP = os.path.join(heat_maps.HEAT_MAP_DIR, '')
+# File with the name of the current heat map, read by the heat map view
+HEAT_MAP_POINTER = heat_maps.HEAT_MAP_POINTER
 PATH_GRAPH = 'static/covid19web/img/'
+# Days until the last date with data for the heat map, field for the weight of every location and size in
+# degrees of the grid for joining the near locations (0 without grid)
+HEATMAP_DAYS = int(os.getenv('HEATMAP_DAYS', 1))
+HEATMAP_WEIGHT = os.getenv('HEATMAP_WEIGHT', 'confirmed_cases')
+HEATMAP_GRID = float(os.getenv('HEATMAP_GRID', 0))
+# Rows read from the DB in every chunk
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 2000))
 
 # Load env file
 load_dotenv(find_dotenv())
@@ -39,67 +60,61 @@ load_dotenv(find_dotenv())
 logging.basicConfig(level=os.getenv('LOG_LEVEL', 'ERROR'))
 
 
-def generate_graph(_list_data, _label='Graph', _color='Pink'):
+def save_heat_map(_html):
     """
-    Method for generate the graph with the data
-    :param _color: Color for the line in the graph
-    :param _label: Label to show in the plot
-    :param _list_data: List of data to show
+    Save the heat map with the content hash in the name, so it can be cached forever, with its gzip and
+    brotli versions which the heat map view serves directly. The previous heat maps are deleted.
+    :param _html: Content of the heat map
+    :return: Name of the file
     """
+    os.makedirs(PATH_HEAT_MAP, exist_ok=True)
+    name = f'heat_map.{hashlib.md5(_html).hexdigest()[:12]}.html'
 
-    try:
-        logging.info(f'Start to generate the graph of {_label}')
-
-        # Generate the graph
-        x = [i for i in range(0, len(_list_data))]
-        plt.style.use('seaborn-talk')
-        plt.plot(x, _list_data, color=_color, label=_label, linewidth=1.0)
-        plt.xlabel('Days')
-        plt.ylabel('People number')
-        plt.title(f'COVID-19 Evolution')
-        plt.grid(True)
-        plt.legend(loc='upper left')
-        plt.savefig(f'{PATH_GRAPH}graph_{_color}.png')
-        # plt.show()
-        plt.close()
-
-        print(f'Graph of {_label} generates successfully')
-    except Exception as err:
-        logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
-                      f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
-                      f'Type Error: {type(err).__name__} \n'
-                      f'Arguments:\n {err.args} \n'
-                      f'Error:\n {format(err)}')
-        raise
+    variants = {name: _html, f'{name}.gz': gzip.compress(_html, compresslevel=9)}
+    if brotli is not None:
+        variants[f'{name}.br'] = brotli.compress(_html)
+    for file_name, content in variants.items():
+        with open(f'{PATH_HEAT_MAP}{file_name}', 'wb') as file:
+            file.write(content)
+
+    # The pointer is changed after the new files exist
+    with open(f'{PATH_HEAT_MAP}{HEAT_MAP_POINTER}.tmp', 'w') as file:
+        json.dump({'file': name}, file)
+    os.replace(f'{PATH_HEAT_MAP}{HEAT_MAP_POINTER}.tmp', f'{PATH_HEAT_MAP}{HEAT_MAP_POINTER}')
+
+    for file_name in os.listdir(PATH_HEAT_MAP):
+        if file_name.startswith('heat_map.') and file_name != HEAT_MAP_POINTER and \
+                file_name.split('.')[1] != name.split('.')[1]:
+            os.remove(f'{PATH_HEAT_MAP}{file_name}')
+
+    return name
 
 
 def generate_heat_map(_queryset):
     """
-    Method to generate a heat map with all the values
-    :param _queryset: List of values for every day
+    Method to generate a heat map with the locations weighted by their cases
+    :param _queryset: List of values with latitude, longitude and weight of every location
     """
 
     logging.info('Start to generate the heat map')
 
+    row = None
     try:
         heat_map = folium.Map(location=[43, 0],
                               zoom_start='3',
-                              tiles='Stamen Toner',
+                              tiles='CartoDB Positron',
                               width='99%',
                               height='99%')
-        location = []
 
-        for row in _queryset:
-            if row['latitude'] is None or row['longitude'] is None or \
-                    math.isnan(row['latitude']) or math.isnan(row['longitude']):
-                pass
-            else:
-                location.append([row['latitude'], row['longitude']])
+        # Logarithmic scale from 0 to 1, the cases go from a few to millions
+        max_weight = math.log1p(max((row['weight'] for row in _queryset), default=0)) or 1
+        location = [[row['latitude'], row['longitude'], math.log1p(row['weight']) / max_weight]
+                    for row in _queryset]
 
         HeatMap(location, radius=16).add_to(heat_map)
-        heat_map.save(f'{PATH_MAP}heatMap.html')
+        name = save_heat_map(heat_map.get_root().render().encode())
 
-        print('Heat map successfully generated in html')
+        print(f'Heat map successfully generated in {PATH_HEAT_MAP}{name} with {len(location)} points')
 
     except Exception as err:
         logging.error(f'\nRow: {row}'
@@ -107,46 +122,121 @@ def generate_heat_map(_queryset):
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
 
 
 def get_accumulate_amounts():
     """
-    Return the accumulate amounts per day
-    :return: Return a queryset
+    Return the accumulate amounts per day from the global rollup, read in only one query
+    :return: Return a dataframe with a column for the date and for every cases field
     """
+    df_amounts = pd.DataFrame(columns=['date', *CASES_FIELDS])
     try:
-        queryset = DataCovid19Item.objects.values('date').annotate(dead_cases=Sum('dead_cases'),
-                                                                   confirmed_cases=Sum('confirmed_cases'),
-                                                                   recovered_cases=Sum('recovered_cases'),
-                                                                   active_cases=Sum('active_cases'),
-                                                                   ).order_by('date')
-        return queryset
+        queryset = GlobalDaily.objects.order_by('date').values_list('date', *CASES_FIELDS)
+        df_amounts = pd.DataFrame.from_records(queryset.iterator(chunk_size=CHUNK_SIZE),
+                                               columns=['date', *CASES_FIELDS])
+        return df_amounts
 
     except Exception as err:
         logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
     finally:
-        print(f'Getting {len(queryset)} rows from the DB with accumulate amounts')
+        print(f'Getting {len(df_amounts)} rows from the DB with accumulate amounts')
+
+
+def get_graph_jobs(_df_amounts):
+    """
+    Return the global graphs to render, the graphs of the countries are rendered on demand by the graph view
+    :param _df_amounts: Dataframe with the global amounts per day
+    :return: List of tuples with the path of the image, the values, the label and the color
+    """
+    # Every column of the dataframe is the list of values for each type (dead, recovered, confirmed)
+    return [(f'{PATH_GRAPH}graph_{color}.png', _df_amounts[field].to_numpy(), label, color)
+            for field, label, color in graphs.GRAPH_TYPES.values()]
 
 
-def get_location_coordinates():
+def get_archive_locations(_date_from, _date_to, _weight=HEATMAP_WEIGHT):
     """
-    Return all the location coordinates
-    :return: Return a queryset
+    Return the different locations between two dates from the archive, read memory-mapped, weighted by
+    the maximum cases of every location. The rows without valid coordinates are discarded.
+    :param _date_from: First date
+    :param _date_to: Last date
+    :param _weight: Field with the cases for the weight
+    :return: Return a list of values with latitude, longitude and weight
     """
+    df_locations = archive.read_archive(['latitude', 'longitude', _weight], _date_from, _date_to)
+    df_locations = df_locations[df_locations['latitude'].between(-90, 90) &
+                                df_locations['longitude'].between(-180, 180) & (df_locations[_weight] > 0)]
+    return df_locations.groupby(['latitude', 'longitude'], sort=False)[_weight].max().rename('weight') \
+        .reset_index().to_dict('records')
+
+
+def get_location_coordinates(_days=HEATMAP_DAYS, _weight=HEATMAP_WEIGHT, _grid=HEATMAP_GRID):
+    """
+    Return the different locations in the last days with data, weighted by the cases in the last date of
+    every location. The rows without valid coordinates (NULL or NaN) are discarded in the query. When the
+    archive has all the dates, the data is read from it instead of the DB.
+    :param _days: Number of days until the last date with data
+    :param _weight: Field with the cases for the weight
+    :param _grid: Size in degrees of the grid for joining the near locations, 0 without grid
+    :return: Return a list of values with latitude, longitude and weight
+    """
+    locations = []
     try:
-        queryset = DataCovid19Item.objects.values('latitude', 'longitude')
-        return queryset
+        max_date = DataCovid19Item.objects.aggregate(max_date=Max('date'))['max_date']
+        if max_date is None:
+            return locations
+
+        date_from = max_date - timedelta(days=_days - 1)
+        dates = DataCovid19Item.objects.filter(date__gte=date_from).values_list('date', flat=True).distinct().order_by()
+        if archive.is_enabled() and set(dates) <= set(archive.get_archive_dates(date_from, max_date)):
+            rows = get_archive_locations(date_from, max_date, _weight)
+        else:
+            # NaN is greater than any number in PostgreSQL, so the ranges discard it too
+            queryset = DataCovid19Item.objects.filter(date__gte=date_from,
+                                                      location__latitude__range=(-90, 90),
+                                                      location__longitude__range=(-180, 180),
+                                                      **{f'{_weight}__gt': 0},
+                                                      ).values(latitude=F('location__latitude'),
+                                                               longitude=F('location__longitude'))\
+                .annotate(weight=Max(_weight))
+            rows = queryset.order_by().iterator(chunk_size=CHUNK_SIZE)
+
+        if _grid:
+            grid = {}
+            for row in rows:
+                cell = (round(row['latitude'] / _grid) * _grid, round(row['longitude'] / _grid) * _grid)
+                grid[cell] = grid.get(cell, 0) + row['weight']
+            locations = [{'latitude': latitude, 'longitude': longitude, 'weight': weight}
+                         for (latitude, longitude), weight in grid.items()]
+        else:
+            locations = list(rows)
+
+        return locations
 
     except Exception as err:
         logging.error(f'\nLine: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
     finally:
-        print(f'Getting {len(queryset)} rows from the DB with location coordinates')
+        print(f'Getting {len(locations)} locations from the DB for the heat map')
+
+
+def graphs_job():
+    """ Generate the graphs, only the ones whose data has changed """
+    jobs = get_graph_jobs(get_accumulate_amounts())
+    rendered = graphs.render_graphs(jobs)
+    print(f'{len(rendered)} of {len(jobs)} graphs generated successfully')
+
+
+def heat_map_job():
+    """ Generate the heat map """
+    generate_heat_map(get_location_coordinates())
 
 
 def cron_graph():
@@ -154,37 +244,28 @@ def cron_graph():
     Method to generate graphs and heat map from DB data
     """
     try:
-        queryset = get_accumulate_amounts()
-
-        # From the queryset get a list with values for each type (dead, recovered, confirmed)
-        generate_graph([queryset[row]['dead_cases'] for row in range(0, len(queryset))],
-                       'Dead cases', 'red')
-        generate_graph([queryset[row]['confirmed_cases'] for row in range(0, len(queryset))],
-                       'Confirmed cases', 'black')
-        generate_graph([queryset[row]['recovered_cases'] for row in range(0, len(queryset))],
-                       'Recovered cases', 'blue')
-
-        # Generate heat map
-        queryset = get_location_coordinates()
-        generate_heat_map(queryset)
+        graphs_job()
+        heat_map_job()
 
     except Exception as err:
         logging.error(f'\nError at line: {err.__traceback__.tb_lineno} \n'
                       f'File: {err.__traceback__.tb_frame.f_code.co_filename} \n'
                       f'Type Error: {type(err).__name__} \n'
                       f'Arguments:\n {err.args}')
+        raise
 
 
-# Schedule the cron
-print(f'{Fore.GREEN}********* START CRON Graphs Covid - {SETUP_DATA["title"]} *********')
-cron_covid19_graphs = BlockingScheduler()
-if os.getenv('ENV_PRO', 'Y') == 'Y':
-    print('Running in PRODUCTION environment')
-    cron_covid19_graphs.add_job(cron_graph, 'cron', hour='13')
-else:
-    print('Running in LOCAL environment')
-    cron_covid19_graphs.add_job(cron_graph, 'cron', minute='*')  # For testing in local set minute='*'
-cron_covid19_graphs.start()
+if __name__ == '__main__':
+    # Schedule the cron
+    print(f'{Fore.GREEN}********* START CRON Graphs Covid - {SETUP_DATA["title"]} *********')
+    cron_covid19_graphs = BlockingScheduler()
+    if os.getenv('ENV_PRO', 'Y') == 'Y':
+        print('Running in PRODUCTION environment')
+        cron_covid19_graphs.add_job(cron_graph, 'cron', hour='13')
+    else:
+        print('Running in LOCAL environment')
+        cron_covid19_graphs.add_job(cron_graph, 'cron', minute='*')  # For testing in local set minute='*'
+    cron_covid19_graphs.start()
 
 """
 # Create the cron object
@@ -0,0 +1,107 @@
+"""
+Local cache of the CSV files of daily data. Every url is saved in the folder CSV_CACHE_DIR with two files:
+<key>.csv with the content and <key>.json with the url, ETag, Last-Modified and content hash. The files are
+revalidated with conditional requests after CSV_CACHE_TTL seconds. The content hash is compared with the
+ingest ledger for not saving again in DB the files without changes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+# Empty CSV_CACHE_DIR disables the cache
+CSV_CACHE_DIR = os.getenv('CSV_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'csv_cache'))
+CSV_CACHE_TTL = int(os.getenv('CSV_CACHE_TTL', 3600))
+
+
+def get_paths(_url):
+    """ Return the path of the content file and the metadata file for a url """
+    key = hashlib.sha1(_url.encode()).hexdigest()
+    return os.path.join(CSV_CACHE_DIR, f'{key}.csv'), os.path.join(CSV_CACHE_DIR, f'{key}.json')
+
+
+def read_metadata(_url):
+    """ Return the metadata saved for a url or an empty dict """
+    _, path_meta = get_paths(_url)
+    try:
+        with open(path_meta) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_file(_path, _content):
+    """ Write a file in a temporary file and rename it, so a half written file is never read """
+    os.makedirs(CSV_CACHE_DIR, exist_ok=True)
+    mode = 'wb' if isinstance(_content, bytes) else 'w'
+    with open(f'{_path}.tmp', mode) as file:
+        file.write(_content)
+    os.replace(f'{_path}.tmp', _path)
+
+
+def write_metadata(_url, _metadata):
+    """ Save the metadata for a url """
+    _, path_meta = get_paths(_url)
+    write_file(path_meta, json.dumps(_metadata))
+
+
+def fetch(_url, _timeout):
+    """
+    Return the content of a url from the cache, revalidating it if CSV_CACHE_TTL is expired
+    :param _url: Url to a CSV file data source
+    :param _timeout: Timeout in seconds for the download
+    :return: Tuple (content, content hash), (None, None) if the file is not found
+    """
+    if not CSV_CACHE_DIR:
+        try:
+            with urlopen(_url, timeout=_timeout) as response:
+                content = response.read()
+        except (HTTPError, URLError, TimeoutError) as err:
+            logging.error(f'File not found: {_url} ({err})')
+            return None, None
+        return content, hashlib.sha256(content).hexdigest()
+
+    path_csv, _ = get_paths(_url)
+    metadata = read_metadata(_url)
+    cached = metadata and os.path.exists(path_csv)
+
+    if cached and time.time() - metadata.get('checked', 0) < CSV_CACHE_TTL:
+        logging.info(f'File in cache: {_url}')
+        with open(path_csv, 'rb') as file:
+            return file.read(), metadata['sha256']
+
+    headers = {}
+    if cached and metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if cached and metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+
+    try:
+        with urlopen(Request(_url, headers=headers), timeout=_timeout) as response:
+            content = response.read()
+            metadata.update(url=_url,
+                            etag=response.headers.get('ETag'),
+                            last_modified=response.headers.get('Last-Modified'),
+                            sha256=hashlib.sha256(content).hexdigest())
+        write_file(path_csv, content)
+    except HTTPError as err:
+        if err.code != 304 or not cached:
+            logging.error(f'File not found: {_url} ({err})')
+            return None, None
+        logging.info(f'File not modified: {_url}')
+        with open(path_csv, 'rb') as file:
+            content = file.read()
+    except (URLError, TimeoutError) as err:
+        # The timeout reading the response is not wrapped in URLError
+        logging.error(f'File not found: {_url} ({err})')
+        return None, None
+
+    metadata['checked'] = time.time()
+    write_metadata(_url, metadata)
+
+    return content, metadata['sha256']
+